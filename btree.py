@@ -1,148 +1,730 @@
 """
 BTRFS B-tree Traversal - Read and traverse tree blocks.
 """
-from typing import List, Tuple, Optional, BinaryIO
-from structures import (BtrfsHeader, BtrfsItem, BtrfsKeyPtr,
-                        BTRFS_ITEM_SIZE, BTRFS_KEY_PTR_SIZE)
+import io
+import mmap
+import os
+import struct
+import weakref
+from bisect import bisect_right
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List, Tuple, Optional, BinaryIO
+from structures import (BtrfsItem, BtrfsKey, BtrfsKeyPtr,
+                        BTRFS_ITEM_SIZE, BTRFS_KEY_PTR_SIZE,
+                        ITEM_STRUCT, KEY_PTR_STRUCT,
+                        NODE_INFO_STRUCT, NODE_INFO_OFFSET)
 from constants import HEADER_SIZE
 from chunk import ChunkMap
 
+# Maximum number of tree blocks read per batch during traversal
+READ_BATCH_SIZE = 256
+
+# Batches needing at least this many separate reads use the thread pool
+PARALLEL_READ_THRESHOLD = 8
+
+_HAS_PREAD = hasattr(os, 'pread')
+_HAS_PREADV = hasattr(os, 'preadv')
+_HAS_SENDFILE = hasattr(os, 'sendfile')
+_HAS_FADVISE = hasattr(os, 'posix_fadvise')
+_HAS_MADVISE = hasattr(mmap.mmap, 'madvise') and hasattr(mmap, 'MADV_WILLNEED')
+_READ_EXECUTOR: Optional[ThreadPoolExecutor] = None
+
+# Memory budget for recently walked internal tree nodes, per open image
+NODE_CACHE_BYTES = 64 * 1024 * 1024
+
+
+def map_image(f: BinaryIO) -> Optional[mmap.mmap]:
+    """
+    Map an open image file read-only for random tree-block access.
+
+    Returns None if the file cannot be mapped (e.g. empty file or pipe);
+    callers then fall back to regular reads.
+    """
+    try:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError, io.UnsupportedOperation):
+        return None
+
+    if hasattr(mm, 'madvise'):
+        # B-tree walks jump around the image; readahead would be wasted
+        mm.madvise(mmap.MADV_RANDOM)
+    return mm
+
+
+@contextmanager
+def open_image(path: str) -> Iterator[BinaryIO]:
+    """
+    Open an image for reading, memory-mapped when possible.
+
+    Yields the mmap (which also supports seek()/read()), or the plain file
+    object if the image cannot be mapped.
+    """
+    with open(path, 'rb') as f:
+        mm = map_image(f)
+        if mm is None:
+            _fadvise(f, os.POSIX_FADV_RANDOM if _HAS_FADVISE else None)
+            yield f
+            return
+        try:
+            yield mm
+        finally:
+            try:
+                mm.close()
+            except BufferError:
+                pass  # A view is still held (e.g. by a traceback); GC unmaps it
+
+
+def _fadvise(f: BinaryIO, advice: Optional[int]) -> None:
+    """posix_fadvise() the whole of an open image file; ignored where unsupported."""
+    if advice is None:
+        return
+    try:
+        os.posix_fadvise(f.fileno(), 0, 0, advice)
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        pass  # Only a hint
+
+
+def advise_sequential(f: BinaryIO) -> None:
+    """Switch an open image to sequential readahead (e.g. for file data)."""
+    if isinstance(f, mmap.mmap):
+        if hasattr(mmap, 'MADV_SEQUENTIAL'):
+            try:
+                f.madvise(mmap.MADV_SEQUENTIAL)
+            except OSError:
+                pass  # Only a hint
+    else:
+        _fadvise(f, os.POSIX_FADV_SEQUENTIAL if _HAS_FADVISE else None)
+
+
+def read_at(f: BinaryIO, offset: int, size: int) -> bytes:
+    """
+    Read `size` bytes at `offset` of an open image (f may be an mmap).
+
+    Plain files are read with a single os.pread() where available, which
+    also leaves the file position alone.
+    """
+    if isinstance(f, mmap.mmap):
+        return f[offset:offset + size]
+
+    if _HAS_PREAD:
+        try:
+            fd = f.fileno()
+        except (AttributeError, io.UnsupportedOperation):
+            pass  # e.g. an in-memory stream
+        else:
+            return os.pread(fd, size, offset)
+
+    f.seek(offset)
+    return f.read(size)
+
+
+def copy_to_fd(f: BinaryIO, offset: int, size: int, out_fd: int) -> int:
+    """
+    Copy `size` bytes at `offset` of an open image straight to `out_fd`.
+
+    Mapped images are written from the mapping itself and plain files go
+    through os.sendfile() where available, so no intermediate bytes object
+    is built. Like read_at(), stops early at the end of the image.
+
+    Returns:
+        Number of bytes copied
+    """
+    copied = 0
+    if isinstance(f, mmap.mmap):
+        with memoryview(f) as mv:
+            with mv[offset:offset + size] as chunk:
+                while copied < len(chunk):
+                    copied += os.write(out_fd, chunk[copied:])
+        return copied
+
+    if _HAS_SENDFILE:
+        try:
+            fd = f.fileno()
+        except (AttributeError, io.UnsupportedOperation):
+            pass
+        else:
+            while copied < size:
+                n = os.sendfile(out_fd, fd, offset + copied, size - copied)
+                if not n:
+                    break
+                copied += n
+            return copied
+
+    data = read_at(f, offset, size)
+    while copied < len(data):
+        copied += os.write(out_fd, data[copied:])
+    return copied
+
 
 def read_tree_block(f: BinaryIO, logical_addr: int,
                     chunk_map: ChunkMap, nodesize: int) -> bytes:
-    """Read a tree block given its logical address."""
+    """Read a tree block given its logical address (f may be an mmap)."""
     physical = chunk_map.logical_to_physical(logical_addr)
     if physical is None:
         raise ValueError(f"Cannot map logical address 0x{logical_addr:x}")
 
-    f.seek(physical)
-    return f.read(nodesize)
+    return read_at(f, physical, nodesize)
+
+
+def _read_run(fd: int, physical: int, count: int, nodesize: int) -> List[bytes]:
+    """Read `count` physically adjacent tree blocks starting at `physical`."""
+    if count == 1:
+        return [os.pread(fd, nodesize, physical)]
+
+    buffers = [bytearray(nodesize) for _ in range(count)]
+    remaining = os.preadv(fd, buffers, physical)
+    for buf in buffers:
+        # Short read at end of image: truncate like f.read() would
+        if remaining < nodesize:
+            del buf[max(remaining, 0):]
+        remaining -= nodesize
+    return buffers
+
+
+def _get_read_executor() -> ThreadPoolExecutor:
+    """Return the shared thread pool used for parallel block reads."""
+    global _READ_EXECUTOR
+    if _READ_EXECUTOR is None:
+        _READ_EXECUTOR = ThreadPoolExecutor(max_workers=min(32, (os.cpu_count() or 1) * 4))
+    return _READ_EXECUTOR
 
 
-def parse_leaf_items(block: bytes) -> List[Tuple[BtrfsItem, bytes]]:
+def read_tree_blocks(f: BinaryIO, logical_addrs: List[int],
+                     chunk_map: ChunkMap, nodesize: int,
+                     copy: bool = True) -> List[Optional[bytes]]:
     """
-    Parse all items from a leaf node.
-    Returns list of (item_descriptor, item_data) tuples.
+    Read several tree blocks in one batch.
+
+    If `f` is an mmap the blocks are sliced straight out of the mapping
+    (as memoryviews into it, without copying, when `copy` is False).
+    Otherwise, blocks that are physically adjacent on disk are coalesced into a single
+    vectored read (os.preadv). When a batch needs many separate reads they
+    are issued concurrently from a thread pool. Returns one entry per
+    address, in the same order; unmappable addresses yield None.
+    """
+    blocks: List[Optional[bytes]] = [None] * len(logical_addrs)
+
+    mapped = []
+    for i, logical_addr in enumerate(logical_addrs):
+        physical = chunk_map.logical_to_physical(logical_addr)
+        if physical is not None:
+            mapped.append((physical, i))
+
+    if isinstance(f, mmap.mmap):
+        if not copy:
+            with memoryview(f) as view:
+                for physical, i in mapped:
+                    blocks[i] = view[physical:physical + nodesize]
+            return blocks
+        for physical, i in mapped:
+            blocks[i] = f[physical:physical + nodesize]
+        return blocks
+
+    if not _HAS_PREADV:
+        # No vectored I/O on this platform (e.g. Windows)
+        for physical, i in mapped:
+            f.seek(physical)
+            blocks[i] = f.read(nodesize)
+        return blocks
+
+    # Group into runs of blocks that follow on directly: [(physical, [index, ...])]
+    mapped.sort()
+    runs = []
+    for physical, i in mapped:
+        if runs and physical == runs[-1][0] + len(runs[-1][1]) * nodesize:
+            runs[-1][1].append(i)
+        else:
+            runs.append((physical, [i]))
+
+    fd = f.fileno()
+    if len(runs) >= PARALLEL_READ_THRESHOLD:
+        # pread releases the GIL, so concurrent reads overlap their latency
+        results = _get_read_executor().map(
+            lambda run: _read_run(fd, run[0], len(run[1]), nodesize), runs)
+    else:
+        results = (_read_run(fd, physical, len(indices), nodesize)
+                   for physical, indices in runs)
+
+    for (_, indices), run_blocks in zip(runs, results):
+        for i, block in zip(indices, run_blocks):
+            blocks[i] = block
+
+    return blocks
+
+
+def _read_range_run(fd: int, physical: int, sizes: List[int]) -> List[bytes]:
+    """Read physically adjacent ranges starting at `physical` in one go."""
+    if len(sizes) == 1:
+        return [os.pread(fd, sizes[0], physical)]
+
+    buffers = [bytearray(size) for size in sizes]
+    remaining = os.preadv(fd, buffers, physical)
+    for buf, size in zip(buffers, sizes):
+        # Short read at end of image: truncate like f.read() would
+        if remaining < size:
+            del buf[max(remaining, 0):]
+        remaining -= size
+    return buffers
+
+
+def read_ranges(f: BinaryIO, ranges: List[Tuple[int, int]]) -> List[bytes]:
+    """
+    Read several (physical_offset, length) ranges of an image in one batch.
+
+    As in read_tree_blocks(), ranges that follow on directly from each other
+    are read with a single vectored read (os.preadv) and many separate reads
+    are issued from the thread pool. Returns one entry per range, in the
+    same order; like read_at(), a range stops early at the end of the image.
+    """
+    fd = None
+    if _HAS_PREADV and not isinstance(f, mmap.mmap):
+        try:
+            fd = f.fileno()
+        except (AttributeError, io.UnsupportedOperation):
+            pass
+    if fd is None:
+        return [read_at(f, physical, length) for physical, length in ranges]
+
+    # Group into runs of ranges that follow on directly: [[physical, end, [index, ...]]]
+    runs = []
+    for i in sorted(range(len(ranges)), key=ranges.__getitem__):
+        physical, length = ranges[i]
+        if runs and physical == runs[-1][1] and len(runs[-1][2]) < READ_BATCH_SIZE:
+            runs[-1][1] += length
+            runs[-1][2].append(i)
+        else:
+            runs.append([physical, physical + length, [i]])
+
+    def read_run(run):
+        return _read_range_run(fd, run[0], [ranges[i][1] for i in run[2]])
+
+    if len(runs) >= PARALLEL_READ_THRESHOLD:
+        # pread releases the GIL, so concurrent reads overlap their latency
+        results = _get_read_executor().map(read_run, runs)
+    else:
+        results = map(read_run, runs)
+
+    data: List[Optional[bytes]] = [None] * len(ranges)
+    for run, run_data in zip(runs, results):
+        for i, buf in zip(run[2], run_data):
+            data[i] = buf
+    return data
+
+
+def iter_leaf_blocks(f: BinaryIO, root_addr: int, chunk_map: ChunkMap,
+                     nodesize: int) -> Iterator[bytes]:
+    """
+    Yield the leaf blocks of a tree in key order.
+
+    The tree is walked level by level so that the children of many internal
+    nodes can be fetched together with read_tree_blocks(). A regular file is
+    mapped once for the duration of the walk.
+    """
+    for block, _ in _iter_leaves(f, root_addr, chunk_map, nodesize):
+        yield block
+
+
+def _iter_leaves(f: BinaryIO, root_addr: int, chunk_map: ChunkMap,
+                 nodesize: int) -> Iterator[Tuple[bytes, int]]:
+    """
+    Like iter_leaf_blocks() but yields (block, nritems), so callers can
+    parse the leaf without decoding its header again.
+    """
+    mm = None
+    if not isinstance(f, mmap.mmap):
+        mm = map_image(f)
+        if mm is not None:
+            f = mm
+
+    try:
+        yield from _walk_leaf_blocks(f, root_addr, chunk_map, nodesize)
+    finally:
+        if mm is not None:
+            try:
+                mm.close()
+            except BufferError:
+                pass  # A view is still held (e.g. by a traceback); GC unmaps it
+
+
+class _NodeCache:
+    """Bounded LRU of tree blocks, sized in bytes rather than entries."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._blocks: 'OrderedDict[tuple, bytes]' = OrderedDict()
+        self._bytes = 0
+
+    def get(self, key: tuple) -> Optional[bytes]:
+        block = self._blocks.get(key)
+        if block is not None:
+            self._blocks.move_to_end(key)
+        return block
+
+    def put(self, key: tuple, block: bytes) -> None:
+        if key in self._blocks:
+            return
+        self._blocks[key] = block
+        self._bytes += len(block)
+        while self._bytes > self.max_bytes and self._blocks:
+            _, evicted = self._blocks.popitem(last=False)
+            self._bytes -= len(evicted)
+
+
+# Open image (file or mmap) -> its _NodeCache; dropped with the image
+_NODE_CACHES: 'weakref.WeakKeyDictionary' = weakref.WeakKeyDictionary()
+
+
+def _get_node_cache(f: BinaryIO) -> Optional[_NodeCache]:
+    """Return the block cache for an open image, if it can have one."""
+    try:
+        cache = _NODE_CACHES.get(f)
+        if cache is None:
+            cache = _NODE_CACHES[f] = _NodeCache(NODE_CACHE_BYTES)
+    except TypeError:
+        return None  # Not weak-referenceable
+    return cache
+
+
+def _read_tree_blocks_cached(f: BinaryIO, logical_addrs: List[int], chunk_map: ChunkMap,
+                             nodesize: int) -> List[Optional[bytes]]:
+    """
+    read_tree_blocks() through the image's cache of internal nodes.
+
+    Every lookup and walk passes through the upper levels of a tree, so
+    internal nodes seen recently are served from memory. Leaves are
+    mostly read once per walk and are not cached, so a large walk cannot
+    evict the internal nodes.
+    """
+    cache = _get_node_cache(f)
+    if cache is None:
+        return read_tree_blocks(f, logical_addrs, chunk_map, nodesize, copy=False)
+
+    # The same logical address can map differently under another partition offset
+    base = chunk_map.partition_offset
+    blocks = [cache.get((base, addr)) for addr in logical_addrs]
+    missing = [i for i, block in enumerate(blocks) if block is None]
+    if missing:
+        fetched = read_tree_blocks(f, [logical_addrs[i] for i in missing], chunk_map,
+                                   nodesize, copy=False)
+        for i, block in zip(missing, fetched):
+            if (block is not None and len(block) >= HEADER_SIZE and
+                    NODE_INFO_STRUCT.unpack_from(block, NODE_INFO_OFFSET)[1] > 0):
+                # Cached nodes must not pin views into the mapping
+                block = bytes(block)
+                cache.put((base, logical_addrs[i]), block)
+            blocks[i] = block
+    return blocks
+
+
+def prefetch_tree_blocks(f: BinaryIO, logical_addrs: List[int],
+                         chunk_map: ChunkMap, nodesize: int) -> None:
+    """
+    Hint the kernel to start reading tree blocks that will be needed soon.
+
+    Adjacent blocks are merged into one hint. This is advisory only and
+    silently does nothing where neither madvise nor posix_fadvise exists.
+    """
+    prefetch_ranges(f, [(p, nodesize) for p in map(chunk_map.logical_to_physical, logical_addrs)
+                        if p is not None])
+
+
+def prefetch_ranges(f: BinaryIO, ranges: List[Tuple[int, int]]) -> None:
+    """
+    Hint the kernel to start reading (physical_offset, length) ranges of an image.
+
+    Overlapping and adjacent ranges are merged into one hint. Advisory only,
+    like prefetch_tree_blocks().
+    """
+    is_mmap = isinstance(f, mmap.mmap)
+    if not (_HAS_MADVISE if is_mmap else _HAS_FADVISE):
+        return
+
+    merged = []
+    for physical, length in sorted(ranges):
+        if merged and physical <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], physical + length)
+        else:
+            merged.append([physical, physical + length])
+    ranges = merged
+
+    try:
+        if is_mmap:
+            size = len(f)
+            for start, end in ranges:
+                start -= start % mmap.PAGESIZE  # madvise needs a page-aligned start
+                end = min(end, size)
+                if start < end:
+                    f.madvise(mmap.MADV_WILLNEED, start, end - start)
+        else:
+            fd = f.fileno()
+            for start, end in ranges:
+                os.posix_fadvise(fd, start, end - start, os.POSIX_FADV_WILLNEED)
+    except (OSError, ValueError, io.UnsupportedOperation):
+        pass  # Only a hint
+
+
+def _walk_leaf_blocks(f: BinaryIO, root_addr: int, chunk_map: ChunkMap,
+                      nodesize: int) -> Iterator[Tuple[bytes, int]]:
+    """Level-order walk behind iter_leaf_blocks(); yields (leaf, nritems)."""
+    visited = {root_addr}  # Prevent infinite loops; filled as children are queued
+    frontier = deque([root_addr])
+
+    while frontier:
+        batch = [frontier.popleft() for _ in range(min(len(frontier), READ_BATCH_SIZE))]
+
+        for block in _read_tree_blocks_cached(f, batch, chunk_map, nodesize):
+            if block is None or len(block) < HEADER_SIZE:
+                continue  # Skip unmappable addresses and short reads
+
+            nritems, level = NODE_INFO_STRUCT.unpack_from(block, NODE_INFO_OFFSET)
+
+            if level == 0:
+                # Hand out immutable leaves whether they came from the
+                # mapping (memoryview) or from preadv (bytearray)
+                yield (block if isinstance(block, bytes) else bytes(block)), nritems
+            else:
+                # Internal node - queue children for the next batch
+                ptr_array = memoryview(block)[HEADER_SIZE:HEADER_SIZE + nritems * BTRFS_KEY_PTR_SIZE]
+                try:
+                    children = [ptr[3] for ptr in KEY_PTR_STRUCT.iter_unpack(ptr_array)]
+                except struct.error:
+                    continue  # Skip malformed nodes
+                # Drop already-queued blocks here, before they reach a read batch
+                children = [addr for addr in dict.fromkeys(children) if addr not in visited]
+                visited.update(children)
+                # Let the kernel fetch them while the rest of this batch is processed
+                prefetch_tree_blocks(f, children, chunk_map, nodesize)
+                frontier.extend(children)
+
+
+def iter_leaf_items(block: bytes,
+                    nritems: Optional[int] = None) -> Iterator[Tuple[BtrfsItem, memoryview]]:
+    """
+    Yield (item_descriptor, item_data) tuples for every item of a leaf node.
+
+    item_data is a zero-copy memoryview into `block`; call bytes() on it
+    before storing it beyond the lifetime of the traversal.
 
     Layout:
     [header 101 bytes][item0][item1]...[itemN]...[dataN]...[data1][data0]
     Items grow forward, data grows backward from end of block.
+
+    Passing `nritems` (from an already decoded header) skips re-reading
+    the header and the leaf check.
     """
-    header = BtrfsHeader.unpack(block)
+    if nritems is None:
+        nritems, level = NODE_INFO_STRUCT.unpack_from(block, NODE_INFO_OFFSET)
+        if level != 0:
+            raise ValueError(f"Not a leaf node: level={level}")
 
-    if header.level != 0:
-        raise ValueError(f"Not a leaf node: level={header.level}")
+    mv = memoryview(block)
+    item_array = mv[HEADER_SIZE:HEADER_SIZE + nritems * BTRFS_ITEM_SIZE]
 
-    items = []
-    item_pos = HEADER_SIZE  # 101 bytes
+    # item.offset is relative to start of block data area
+    # Data area starts after header at offset HEADER_SIZE
+    for objectid, type_, offset, data_offset, size in ITEM_STRUCT.iter_unpack(item_array):
+        yield (BtrfsItem(BtrfsKey(objectid, type_, offset), data_offset, size),
+               mv[HEADER_SIZE + data_offset:HEADER_SIZE + data_offset + size])
 
-    for i in range(header.nritems):
-        item = BtrfsItem.unpack(block, item_pos)
 
-        # item.offset is relative to start of block data area
-        # Data area starts after header at offset HEADER_SIZE
-        data_start = HEADER_SIZE + item.offset
-        data = block[data_start:data_start + item.size]
+def parse_leaf_items(block: bytes,
+                     nritems: Optional[int] = None) -> List[Tuple[BtrfsItem, memoryview]]:
+    """
+    Parse all items from a leaf node.
+    Returns list of (item_descriptor, item_data) tuples; see iter_leaf_items().
+    """
+    return list(iter_leaf_items(block, nritems))
 
-        items.append((item, data))
-        item_pos += BTRFS_ITEM_SIZE  # 25 bytes
 
-    return items
+def iter_leaf_items_filtered(block: bytes, target_objectid: int,
+                             target_type: Optional[int] = None,
+                             nritems: Optional[int] = None
+                             ) -> Iterator[Tuple[BtrfsItem, memoryview]]:
+    """
+    Yield only the (item, data) tuples of a leaf whose key matches
+    objectid (and optionally type).
 
+    Keys are checked straight off the unpacked item array, so
+    non-matching items never get a BtrfsItem or data view built.
+    `nritems` works as in iter_leaf_items().
+    """
+    if nritems is None:
+        nritems, level = NODE_INFO_STRUCT.unpack_from(block, NODE_INFO_OFFSET)
+        if level != 0:
+            raise ValueError(f"Not a leaf node: level={level}")
 
-def parse_internal_node(block: bytes) -> List[BtrfsKeyPtr]:
-    """Parse key pointers from an internal node."""
-    header = BtrfsHeader.unpack(block)
+    mv = memoryview(block)
+    item_array = mv[HEADER_SIZE:HEADER_SIZE + nritems * BTRFS_ITEM_SIZE]
 
-    if header.level == 0:
+    for objectid, type_, offset, data_offset, size in ITEM_STRUCT.iter_unpack(item_array):
+        if objectid != target_objectid:
+            continue
+        if target_type is not None and type_ != target_type:
+            continue
+        yield (BtrfsItem(BtrfsKey(objectid, type_, offset), data_offset, size),
+               mv[HEADER_SIZE + data_offset:HEADER_SIZE + data_offset + size])
+
+
+def iter_internal_node(block: bytes) -> Iterator[BtrfsKeyPtr]:
+    """Yield the key pointers of an internal node."""
+    nritems, level = NODE_INFO_STRUCT.unpack_from(block, NODE_INFO_OFFSET)
+
+    if level == 0:
         raise ValueError("Not an internal node: level=0")
 
-    ptrs = []
-    ptr_pos = HEADER_SIZE  # 101 bytes
+    ptr_array = memoryview(block)[HEADER_SIZE:HEADER_SIZE + nritems * BTRFS_KEY_PTR_SIZE]
 
-    for i in range(header.nritems):
-        ptr = BtrfsKeyPtr.unpack(block, ptr_pos)
-        ptrs.append(ptr)
-        ptr_pos += BTRFS_KEY_PTR_SIZE  # 33 bytes
+    for objectid, type_, offset, blockptr, generation in KEY_PTR_STRUCT.iter_unpack(ptr_array):
+        yield BtrfsKeyPtr(BtrfsKey(objectid, type_, offset), blockptr, generation)
 
-    return ptrs
+
+def parse_internal_node(block: bytes) -> List[BtrfsKeyPtr]:
+    """Parse key pointers from an internal node."""
+    return list(iter_internal_node(block))
 
 
 def search_tree(f: BinaryIO, root_addr: int, chunk_map: ChunkMap,
                 nodesize: int, target_objectid: int,
-                target_type: Optional[int] = None) -> List[Tuple[BtrfsItem, bytes]]:
+                target_type: Optional[int] = None) -> List[Tuple[BtrfsItem, memoryview]]:
     """
     Search tree for items matching objectid (and optionally type).
     Returns all matching (item, data) tuples.
     """
     results = []
-    visited = set()  # Prevent infinite loops
-
-    def traverse(addr: int):
-        if addr in visited:
-            return
-        visited.add(addr)
 
+    for block, nritems in _iter_leaves(f, root_addr, chunk_map, nodesize):
         try:
-            block = read_tree_block(f, addr, chunk_map, nodesize)
-        except ValueError:
-            return  # Skip unmappable addresses
+            results.extend(iter_leaf_items_filtered(block, target_objectid, target_type, nritems))
+        except (struct.error, ValueError):
+            pass  # Skip malformed leaves
+
+    return results
+
 
-        header = BtrfsHeader.unpack(block)
+def iter_tree_items_from(f: BinaryIO, root_addr: int, chunk_map: ChunkMap,
+                         nodesize: int, min_key: Tuple[int, int, int]
+                         ) -> Iterator[Tuple[Tuple[int, int, int], memoryview]]:
+    """
+    Yield ((objectid, type, offset), data) for the items with key >= min_key,
+    in key order.
 
-        if header.level == 0:
-            # Leaf node - check items
+    Like btrfs_search_slot(), internal nodes are binary searched on their
+    keys, so only the blocks on the path to min_key (and the leaves after
+    it, as far as the caller iterates) are read.
+    """
+    stack = []  # [(child block pointers of an internal node, next index)]
+    visited = set()
+    addr: Optional[int] = root_addr
+    while True:
+        # Descend to the leaf holding min_key, or the next leaf over
+        while addr is not None:
+            if addr in visited:
+                return  # Loop in a corrupted tree
+            visited.add(addr)
             try:
-                for item, data in parse_leaf_items(block):
-                    if item.key.objectid == target_objectid:
-                        if target_type is None or item.key.type == target_type:
-                            results.append((item, data))
-            except Exception:
-                pass  # Skip malformed leaves
+                block = read_tree_block(f, addr, chunk_map, nodesize)
+                nritems, level = NODE_INFO_STRUCT.unpack_from(block, NODE_INFO_OFFSET)
+            except (struct.error, ValueError):
+                return
+            mv = memoryview(block)
+
+            if level == 0:
+                nritems = min(nritems, (len(block) - HEADER_SIZE) // BTRFS_ITEM_SIZE)
+                for objectid, type_, offset, data_offset, size in ITEM_STRUCT.iter_unpack(
+                        mv[HEADER_SIZE:HEADER_SIZE + nritems * BTRFS_ITEM_SIZE]):
+                    key = (objectid, type_, offset)
+                    if key >= min_key:
+                        start = HEADER_SIZE + data_offset
+                        yield key, mv[start:start + size]
+                addr = None
+                break
+
+            nritems = min(nritems, (len(block) - HEADER_SIZE) // BTRFS_KEY_PTR_SIZE)
+            ptrs = list(KEY_PTR_STRUCT.iter_unpack(
+                mv[HEADER_SIZE:HEADER_SIZE + nritems * BTRFS_KEY_PTR_SIZE]))
+            if not ptrs:
+                break
+            # Last child whose first key is <= min_key
+            i = max(bisect_right([ptr[:3] for ptr in ptrs], min_key) - 1, 0)
+            stack.append((ptrs, i + 1))
+            addr = ptrs[i][3]
+
+        # Continue with the next child of the nearest node that has one
+        while stack:
+            ptrs, i = stack.pop()
+            if i < len(ptrs):
+                stack.append((ptrs, i + 1))
+                addr = ptrs[i][3]
+                break
         else:
-            # Internal node - traverse children
-            try:
-                ptrs = parse_internal_node(block)
-                for ptr in ptrs:
-                    traverse(ptr.blockptr)
-            except Exception:
-                pass  # Skip malformed nodes
+            return
 
-    traverse(root_addr)
-    return results
 
+def btree_lookup(f: BinaryIO, root_addr: int, chunk_map: ChunkMap, nodesize: int,
+                 objectid: int, item_type: int) -> Optional[Tuple[Tuple[int, int, int], memoryview]]:
+    """Return the first (key, data) with the given objectid and type, or None."""
+    for key, data in iter_tree_items_from(f, root_addr, chunk_map, nodesize,
+                                          (objectid, item_type, 0)):
+        return (key, data) if key[:2] == (objectid, item_type) else None
+    return None
 
-def traverse_tree_all(f: BinaryIO, root_addr: int, chunk_map: ChunkMap,
-                      nodesize: int) -> List[Tuple[BtrfsItem, bytes]]:
-    """Traverse entire tree and return all items."""
-    results = []
-    visited = set()  # Prevent infinite loops
 
-    def traverse(addr: int):
-        if addr in visited:
-            return
-        visited.add(addr)
+def iter_tree_items(f: BinaryIO, root_addr: int, chunk_map: ChunkMap,
+                    nodesize: int) -> Iterator[Tuple[BtrfsItem, memoryview]]:
+    """Yield every (item, data) tuple of a tree in key order, one leaf at a time."""
+    for block, nritems in _iter_leaves(f, root_addr, chunk_map, nodesize):
+        try:
+            items = iter_leaf_items(block, nritems)
+            first = next(items, None)  # Malformed leaves fail on the first item
+        except (struct.error, ValueError):
+            continue  # Skip malformed leaves
+        if first is not None:
+            yield first
+            yield from items
 
+
+def iter_tree_raw_items(f: BinaryIO, root_addr: int, chunk_map: ChunkMap,
+                        nodesize: int) -> Iterator[Tuple[int, int, int, int, int]]:
+    """
+    Yield the raw item descriptors of a tree in key order as
+    (objectid, type, offset, data_offset, size) tuples.
+
+    No BtrfsItem / BtrfsKey objects or data views are built, for callers
+    that only need keys and item sizes.
+    """
+    for block, nritems in _iter_leaves(f, root_addr, chunk_map, nodesize):
         try:
-            block = read_tree_block(f, addr, chunk_map, nodesize)
-        except ValueError:
-            return  # Skip unmappable addresses
+            descriptors = ITEM_STRUCT.iter_unpack(
+                memoryview(block)[HEADER_SIZE:HEADER_SIZE + nritems * BTRFS_ITEM_SIZE])
+        except struct.error:
+            continue  # Skip malformed leaves
+        yield from descriptors
 
-        header = BtrfsHeader.unpack(block)
 
-        if header.level == 0:
-            # Leaf node
-            try:
-                results.extend(parse_leaf_items(block))
-            except Exception:
-                pass  # Skip malformed leaves
-        else:
-            # Internal node
-            try:
-                for ptr in parse_internal_node(block):
-                    traverse(ptr.blockptr)
-            except Exception:
-                pass  # Skip malformed nodes
+def iter_tree_raw_data(f: BinaryIO, root_addr: int, chunk_map: ChunkMap,
+                       nodesize: int) -> Iterator[Tuple[int, int, int, memoryview]]:
+    """
+    Yield every item of a tree in key order as (objectid, type, offset, data).
 
-    traverse(root_addr)
-    return results
+    Like iter_tree_items(), but the keys are plain tuples decoded a leaf at
+    a time, without a BtrfsItem / BtrfsKey pair per item. data is a
+    zero-copy view into the leaf.
+    """
+    for block, nritems in _iter_leaves(f, root_addr, chunk_map, nodesize):
+        mv = memoryview(block)
+        try:
+            descriptors = ITEM_STRUCT.iter_unpack(
+                mv[HEADER_SIZE:HEADER_SIZE + nritems * BTRFS_ITEM_SIZE])
+        except struct.error:
+            continue  # Skip malformed leaves
+        for objectid, type_, offset, data_offset, size in descriptors:
+            start = HEADER_SIZE + data_offset
+            yield objectid, type_, offset, mv[start:start + size]
+
+
+def traverse_tree_all(f: BinaryIO, root_addr: int, chunk_map: ChunkMap,
+                      nodesize: int) -> List[Tuple[BtrfsItem, memoryview]]:
+    """Traverse entire tree and return all items."""
+    return list(iter_tree_items(f, root_addr, chunk_map, nodesize))
@@ -1,20 +1,40 @@
 import tkinter as tk
 from tkinter import filedialog, messagebox, scrolledtext
+import codecs
+import os
+import subprocess
 import threading
 import sys
+from collections import deque
 
-import btrfs_parser
+PARSER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "btrfs_parser.py")
+
+# Read size for the parser's output pipe
+PIPE_CHUNK_SIZE = 64 * 1024
+
+# How often queued parser output is flushed into the console (ms)
+OUTPUT_FLUSH_MS = 100
+
+# Lines kept in the console while output streams in (full output is kept for search)
+MAX_CONSOLE_LINES = 20000
 
 
 # =========================
 # Stdout Redirector
 # =========================
 class StdoutRedirector:
+    """
+    Collects parser output from the reader thread without touching Tk.
+
+    Tk widgets must only be used from the main loop, so text is queued
+    here and drained by BtrfsParserGUI.flush_output().
+    """
     def __init__(self, gui):
         self.gui = gui
 
     def write(self, text):
-        self.gui.append_output(text)
+        with self.gui.output_lock:
+            self.gui.pending_output.append(text)
 
     def flush(self):
         pass
@@ -41,10 +61,15 @@ class BtrfsParserGUI(tk.Tk):
         self.status_text = tk.StringVar(value="Status: Idle")
         self.search_var = tk.StringVar()
 
-        self.full_output = ""
+        self.full_output_parts = []  # joined on demand; += on a str is O(n) per write
+        self.console_trimmed = False
         self.search_enabled = False
 
+        self.pending_output = deque()
+        self.output_lock = threading.Lock()
+
         self.build_ui()
+        self.after(OUTPUT_FLUSH_MS, self.flush_output)
 
     # =========================
     # UI Layout
@@ -110,6 +135,10 @@ class BtrfsParserGUI(tk.Tk):
 
         self.make_readonly_but_selectable(self.output_console)
 
+        # Search hits are highlighted; filtered-out lines are elided, not deleted
+        self.output_console.tag_config("hit", background="yellow")
+        self.output_console.tag_config("nomatch", elide=True)
+
         # Search / Filter
         frame_search = tk.Frame(self)
         frame_search.pack(fill="x", padx=10, pady=5)
@@ -158,10 +187,36 @@ class BtrfsParserGUI(tk.Tk):
     # Output Handling
     # =========================
     def append_output(self, text):
-        self.full_output += text
+        self.full_output_parts.append(text)
         self.output_console.insert(tk.END, text)
+
+        # Trim from the top so a huge verbose run doesn't bog down the widget
+        lines = int(self.output_console.index("end-1c").split(".")[0])
+        if lines > MAX_CONSOLE_LINES:
+            self.output_console.delete("1.0", f"{lines - MAX_CONSOLE_LINES + 1}.0")
+            self.console_trimmed = True
+
         self.output_console.see(tk.END)
 
+    def drain_output(self):
+        """Move queued parser output into the console in one insert."""
+        with self.output_lock:
+            parts = list(self.pending_output)
+            self.pending_output.clear()
+
+        if parts:
+            self.append_output("".join(parts))
+
+    def flush_output(self):
+        self.drain_output()
+        self.after(OUTPUT_FLUSH_MS, self.flush_output)
+
+    def get_full_output(self):
+        """Return all output of the current run as one string."""
+        if len(self.full_output_parts) > 1:
+            self.full_output_parts[:] = ["".join(self.full_output_parts)]
+        return self.full_output_parts[0] if self.full_output_parts else ""
+
     # =========================
     # Search & Filter
     # =========================
@@ -169,16 +224,43 @@ class BtrfsParserGUI(tk.Tk):
         if not self.search_enabled:
             return
 
-        keyword = self.search_var.get().lower()
-        self.output_console.delete("1.0", tk.END)
+        keyword = self.search_var.get()
+        console = self.output_console
+        self.clear_search()
+        if not keyword:
+            return
 
-        for line in self.full_output.splitlines():
-            if keyword in line.lower():
-                self.output_console.insert(tk.END, line + "\n")
+        # Tk-native search; collect the line numbers that contain a hit
+        matched_lines = []
+        idx = "1.0"
+        while True:
+            idx = console.search(keyword, idx, stopindex=tk.END, nocase=True)
+            if not idx:
+                break
+            end = f"{idx}+{len(keyword)}c"
+            console.tag_add("hit", idx, end)
+            line = int(idx.split(".")[0])
+            if not matched_lines or matched_lines[-1] != line:
+                matched_lines.append(line)
+            idx = end
+
+        # Hide the runs of lines between hits
+        prev = 0
+        for line in matched_lines + [int(console.index(tk.END).split(".")[0])]:
+            if line > prev + 1:
+                console.tag_add("nomatch", f"{prev + 1}.0", f"{line}.0")
+            prev = line
 
     def clear_search(self):
-        self.output_console.delete("1.0", tk.END)
-        self.output_console.insert(tk.END, self.full_output)
+        console = self.output_console
+        if self.console_trimmed:
+            # Put back what was trimmed while streaming so all output is searchable
+            console.delete("1.0", tk.END)
+            console.insert(tk.END, self.get_full_output())
+            self.console_trimmed = False
+
+        console.tag_remove("hit", "1.0", tk.END)
+        console.tag_remove("nomatch", "1.0", tk.END)
 
     # =========================
     # GUI Actions
@@ -201,7 +283,10 @@ class BtrfsParserGUI(tk.Tk):
             messagebox.showerror("Error", "Please select a disk image.")
             return
 
-        self.full_output = ""
+        self.full_output_parts.clear()
+        self.console_trimmed = False
+        with self.output_lock:
+            self.pending_output.clear()
         self.search_enabled = False
         self.search_entry.configure(state="disabled")
         self.search_button.configure(state="disabled")
@@ -212,44 +297,66 @@ class BtrfsParserGUI(tk.Tk):
         threading.Thread(target=self.run_parser_thread, daemon=True).start()
 
     def run_parser_thread(self):
-        argv_backup = sys.argv[:]
+        """
+        Run btrfs_parser.py in a child process and stream its output.
+
+        A separate process keeps the parser off the GUI's interpreter (no
+        GIL contention, no global sys.stdout swap); its combined
+        stdout/stderr is read in large chunks and queued for the console.
+        """
+        cmd = [
+            sys.executable, "-u", PARSER_SCRIPT,
+            self.image_path.get(),
+            "-p", self.partition_offset.get(),
+            "-o", self.output_format.get()
+        ]
+
+        if self.output_file.get():
+            cmd.extend(["-f", self.output_file.get()])
+        if self.info_only.get():
+            cmd.append("--info-only")
+        if self.verbose.get():
+            cmd.append("-v")
+
+        sink = StdoutRedirector(self)
 
         try:
-            sys.argv = [
-                "btrfs_parser.py",
-                self.image_path.get(),
-                "-p", self.partition_offset.get(),
-                "-o", self.output_format.get()
-            ]
-
-            if self.output_file.get():
-                sys.argv.extend(["-f", self.output_file.get()])
-            if self.info_only.get():
-                sys.argv.append("--info-only")
-            if self.verbose.get():
-                sys.argv.append("-v")
-
-            old_stdout = sys.stdout
-            old_stderr = sys.stderr
-            sys.stdout = sys.stderr = StdoutRedirector(self)
-
-            btrfs_parser.main()
+            proc = subprocess.Popen(
+                cmd,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                bufsize=PIPE_CHUNK_SIZE
+            )
+        except OSError as e:
+            self.after(0, self.parser_finished, None, str(e))
+            return
 
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        with proc.stdout:
+            for chunk in iter(lambda: proc.stdout.read1(PIPE_CHUNK_SIZE), b""):
+                sink.write(decoder.decode(chunk))
+            sink.write(decoder.decode(b"", final=True))
+
+        self.after(0, self.parser_finished, proc.wait(), None)
+
+    def parser_finished(self, returncode, error):
+        """Report the end of a parser run (called on the Tk main loop)."""
+        self.drain_output()
+
+        if returncode == 0:
             self.status_text.set("Status: Parsing completed")
             self.search_enabled = True
             self.search_entry.configure(state="normal")
             self.search_button.configure(state="normal")
 
             messagebox.showinfo("Completed", "Parsing completed successfully.")
-
-        except Exception as e:
+        else:
             self.status_text.set("Status: Parsing failed")
-            messagebox.showerror("Parser Error", str(e))
-
-        finally:
-            sys.argv = argv_backup
-            sys.stdout = old_stdout
-            sys.stderr = old_stderr
+            messagebox.showerror(
+                "Parser Error",
+                error or f"Parser exited with status {returncode}; see output for details."
+            )
 
 
 # =========================
@@ -15,16 +15,22 @@ Usage:
 """
 
 import argparse
+import heapq
 import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
 
-from superblock import read_superblock, print_superblock_info
+from superblock import read_superblock_from, print_superblock_info
 from chunk import parse_sys_chunk_array, read_chunk_tree, ChunkMap
-from filesystem import find_fs_tree_root, parse_filesystem, extract_files, find_all_subvolumes, parse_all_subvolumes, parse_checksum_tree, read_file_data, FileSystem
-from output import to_json, to_csv, to_console, to_tree
+from btree import open_image, advise_sequential
+from filesystem import find_fs_tree_root, parse_filesystem, extract_files, find_all_subvolumes, parse_all_subvolumes, parse_checksum_tree, parse_checksum_data, read_file_data_to_fd, prefetch_file_data, FileSystem, HAS_CRC32C
+from output import write_output, write_output_file
 from statistics import calculate_statistics, write_statistics_json
 from partition_detect import detect_btrfs_partitions, format_partition_list
 
+# Search matches listed per page in interactive extraction
+MATCH_PAGE_SIZE = 50
+
 
 def parse_offset(value: str) -> int:
     """Parse offset value - supports decimal, hex (0x), or sector notation (s)."""
@@ -72,6 +78,16 @@ def interactive_extract(image_path, entries, fs, chunk_map):
 
     print("\n=== File Extraction Mode (type 'exit' to quit) ===\n")
 
+    # Map the image once for the whole session instead of per extraction
+    with open_image(image_path) as image:
+        _extraction_loop(image, file_entries, fs, chunk_map)
+
+
+def _extraction_loop(image, file_entries, fs, chunk_map):
+    """Search / select / extract prompts of interactive_extract()."""
+    # Lowercased once up front rather than on every search
+    lower_paths = [e.path.lower() for e in file_entries]
+
     while True:
         try:
             search = input("Search for file: ").strip()
@@ -87,17 +103,27 @@ def interactive_extract(image_path, entries, fs, chunk_map):
             continue
 
         # Case-insensitive substring match on path
-        matches = [e for e in file_entries if search.lower() in e.path.lower()]
+        needle = search.lower()
+        matches = [e for e, path in zip(file_entries, lower_paths) if needle in path]
 
         if not matches:
             print(f"No files matching '{search}'.")
             continue
 
-        # Display numbered results
+        # Display numbered results a page at a time; sizes are only
+        # formatted for the entries actually shown
         print(f"\nFound {len(matches)} file(s):")
-        for i, entry in enumerate(matches, 1):
-            size_str = _format_size(entry.size)
-            print(f"  {i}. {entry.path} ({size_str})")
+        for start in range(0, len(matches), MATCH_PAGE_SIZE):
+            if start:
+                remaining = len(matches) - start
+                try:
+                    more = input(f"  -- {remaining} more: Enter to list, 'q' to stop -- ").strip()
+                except (EOFError, KeyboardInterrupt):
+                    more = 'q'
+                if more.lower() == 'q':
+                    break
+            for i, entry in enumerate(matches[start:start + MATCH_PAGE_SIZE], start + 1):
+                print(f"  {i}. {entry.path} ({_format_size(entry.size)})")
 
         # Get user selection
         try:
@@ -138,35 +164,65 @@ def interactive_extract(image_path, entries, fs, chunk_map):
         # Create destination if it doesn't exist
         os.makedirs(dest, exist_ok=True)
 
+        # One lookup both checks for and fetches each extent list
+        extents_map = fs.extents
+        jobs = [(entry, extents_map.get(entry.unique_inode) if entry.unique_inode is not None else None)
+                for entry in selected]
+
+        # Start readahead for every selected file before the first is written
+        for _, extents in jobs:
+            if extents:
+                prefetch_file_data(image, extents, chunk_map)
+
         # Extract selected files
-        with open(image_path, 'rb') as f:
-            for entry in selected:
-                if entry.unique_inode is None or entry.unique_inode not in fs.extents:
-                    print(f"  [SKIP] {entry.name} - no extent data available")
-                    continue
+        for entry, extents in jobs:
+            if extents is None:
+                print(f"  [SKIP] {entry.name} - no extent data available")
+                continue
 
-                try:
-                    extents = fs.extents[entry.unique_inode]
-                    data = read_file_data(f, extents, chunk_map, entry.size)
-                    out_path = os.path.join(dest, entry.name)
-
-                    # Avoid overwriting: append number if file exists
-                    if os.path.exists(out_path):
-                        base, ext = os.path.splitext(entry.name)
-                        counter = 1
-                        while os.path.exists(out_path):
-                            out_path = os.path.join(dest, f"{base}_{counter}{ext}")
-                            counter += 1
-
-                    with open(out_path, 'wb') as out_f:
-                        out_f.write(data)
-                    print(f"  [OK] {entry.path} -> {out_path} ({_format_size(len(data))})")
-                except Exception as e:
-                    print(f"  [ERROR] {entry.name}: {e}")
+            out_path = None
+            try:
+                out_path, out_f = _create_unique_file(dest, entry.name)
+                with out_f:
+                    written = read_file_data_to_fd(image, extents, chunk_map,
+                                                   out_f.fileno(), entry.size)
+                print(f"  [OK] {entry.path} -> {out_path} ({_format_size(written)})")
+            except Exception as e:
+                if out_path is not None:
+                    # Don't leave an empty or truncated file behind
+                    try:
+                        os.unlink(out_path)
+                    except OSError:
+                        pass
+                print(f"  [ERROR] {entry.name}: {e}")
 
         print()  # Blank line before next search
 
 
+def _create_unique_file(dest, name):
+    """Create a new file for writing in `dest` without overwriting anything.
+
+    Tries `name`, then `base_1.ext`, `base_2.ext`, ... O_EXCL makes the
+    existence check and the create a single atomic open.
+
+    Returns:
+        (path, binary file object)
+    """
+    flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0)
+    base, ext = os.path.splitext(name)
+    candidate = name
+    counter = 0
+    while True:
+        path = os.path.join(dest, candidate)
+        try:
+            fd = os.open(path, flags, 0o666)
+        except FileExistsError:
+            counter += 1
+            candidate = f"{base}_{counter}{ext}"
+            continue
+        return path, os.fdopen(fd, 'wb')
+
+
 def _format_size(size):
     """Format byte size to human-readable string."""
     if size < 1024:
@@ -210,7 +266,7 @@ Offset formats:
     parser.add_argument('-a', '--auto-detect', action='store_true',
                         help='Automatically detect BTRFS partitions (prompts if multiple found)')
     parser.add_argument('-p', '--partition-offset',
-                        type=str, default='4198400s',
+                        type=parse_offset, default='4198400s',
                         help='Partition start offset (sectors with "s" suffix, hex with "0x", or bytes)')
     parser.add_argument('-o', '--output',
                         choices=['console', 'json', 'csv', 'tree'],
@@ -226,6 +282,8 @@ Offset formats:
                         help='Show N most recently accessed files (sorted by atime)')
     parser.add_argument('-e', '--extract', action='store_true',
                         help='Interactive file extraction mode')
+    parser.add_argument('--verify', action='store_true',
+                        help='Verify file data against the checksum tree (CRC32C)')
 
     args = parser.parse_args()
 
@@ -288,68 +346,71 @@ Offset formats:
                 print("\nParsing cancelled.", file=sys.stderr)
                 return 0
         else:
-            # Use manual partition offset
-            partition_offset = parse_offset(args.partition_offset)
+            # Use manual partition offset (already parsed by argparse)
+            partition_offset = args.partition_offset
 
         if args.verbose:
             if partition_offset > 0:
                 print(f"Partition offset: {partition_offset} bytes (0x{partition_offset:x})", file=sys.stderr)
 
-        # Step 1: Read superblock
-        if args.verbose:
-            print(f"Reading superblock from {args.image}...", file=sys.stderr)
+        # One mapping of the image is shared by the superblock read and all
+        # parsing phases
+        with open_image(args.image) as image:
+            # Step 1: Read superblock
+            if args.verbose:
+                print(f"Reading superblock from {args.image}...", file=sys.stderr)
 
-        sb = read_superblock(args.image, partition_offset)
+            sb = read_superblock_from(image, partition_offset)
 
-        if args.info_only:
-            print_superblock_info(sb)
-            return 0
+            if args.info_only:
+                print_superblock_info(sb)
+                return 0
 
-        if args.verbose:
-            print_superblock_info(sb)
-            print(file=sys.stderr)
+            if args.verbose:
+                print_superblock_info(sb)
+                print(file=sys.stderr)
 
-        # Step 2: Build chunk map from sys_chunk_array
-        if args.verbose:
-            print("Parsing initial chunk map from sys_chunk_array...", file=sys.stderr)
+            # Step 2: Build chunk map from sys_chunk_array
+            if args.verbose:
+                print("Parsing initial chunk map from sys_chunk_array...", file=sys.stderr)
 
-        chunk_map = parse_sys_chunk_array(
-            sb.sys_chunk_array,
-            sb.sys_chunk_array_size
-        )
-        # Set partition offset for physical address translation
-        chunk_map.partition_offset = partition_offset
+            chunk_map = parse_sys_chunk_array(
+                sb.sys_chunk_array,
+                sb.sys_chunk_array_size
+            )
+            # Set partition offset for physical address translation
+            chunk_map.partition_offset = partition_offset
 
-        if args.verbose:
-            print(f"  Found {len(chunk_map)} initial chunks", file=sys.stderr)
+            if args.verbose:
+                print(f"  Found {len(chunk_map)} initial chunks", file=sys.stderr)
 
-        # Step 2b: Read full chunk tree to get all chunk mappings
-        if args.verbose:
-            print("Reading full chunk tree...", file=sys.stderr)
+            # Step 2b: Read full chunk tree to get all chunk mappings
+            if args.verbose:
+                print("Reading full chunk tree...", file=sys.stderr)
 
-        with open(args.image, 'rb') as f:
-            chunk_map = read_chunk_tree(f, sb.chunk_root, chunk_map, sb.nodesize)
+            chunk_map = read_chunk_tree(image, sb.chunk_root, chunk_map, sb.nodesize)
 
-        if args.verbose:
-            print(f"  Total chunks after reading chunk tree: {len(chunk_map)}", file=sys.stderr)
+            if args.verbose:
+                print(f"  Total chunks after reading chunk tree: {len(chunk_map)}", file=sys.stderr)
 
-        # Step 3: Find all subvolumes
-        if args.verbose:
-            print("Finding subvolumes...", file=sys.stderr)
+            # Step 3: Find all subvolumes
+            if args.verbose:
+                print("Finding subvolumes...", file=sys.stderr)
 
-        with open(args.image, 'rb') as f:
-            subvolumes = find_all_subvolumes(f, sb, chunk_map)
+            subvolumes = find_all_subvolumes(image, sb, chunk_map)
 
             if args.verbose:
-                print(f"  Found {len(subvolumes)} subvolumes:", file=sys.stderr)
-                for objid, name, bytenr in subvolumes:
-                    print(f"    - {name} (id={objid}, root=0x{bytenr:x})", file=sys.stderr)
+                # One write for the whole list rather than one per subvolume
+                lines = [f"  Found {len(subvolumes)} subvolumes:"]
+                lines.extend(f"    - {name} (id={objid}, root=0x{bytenr:x})"
+                             for objid, name, bytenr in subvolumes)
+                sys.stderr.write('\n'.join(lines) + '\n')
 
             # Step 4: Parse all subvolumes
             if args.verbose:
                 print("Parsing all subvolumes...", file=sys.stderr)
 
-            fs = parse_all_subvolumes(f, sb, chunk_map)
+            fs = parse_all_subvolumes(image, sb, chunk_map, image_path=args.image)
 
             if args.verbose:
                 print(f"  Found {len(fs.inodes)} total inodes", file=sys.stderr)
@@ -358,14 +419,29 @@ Offset formats:
             if args.verbose:
                 print("Parsing checksum tree...", file=sys.stderr)
 
-            fs.checksums = parse_checksum_tree(f, sb, chunk_map)
+            fs.checksums = parse_checksum_tree(image, sb, chunk_map)
 
             if args.verbose:
                 print(f"  Found {len(fs.checksums)} checksum ranges", file=sys.stderr)
 
-        # Step 5: Extract file entries
-        with open(args.image, 'rb') as f:
-            entries = extract_files(fs, chunk_map, f)
+            verified = False
+            if args.verify:
+                if sb.csum_type != 0:
+                    print(f"Warning: checksum type {sb.csum_type} is not CRC32C, skipping verification",
+                          file=sys.stderr)
+                else:
+                    if not HAS_CRC32C:
+                        print("Warning: google-crc32c is not installed; verifying with the pure "
+                              "Python CRC32C, which can take hours on large images "
+                              "(pip install google-crc32c)", file=sys.stderr)
+                    fs.csum_data = parse_checksum_data(image, sb, chunk_map)
+                    verified = True
+
+            # Step 5: Extract file entries (reads file data for hashes and name lookups)
+            advise_sequential(image)
+            entries = extract_files(fs, chunk_map, image, image_path=args.image,
+                                    verify=verified, sectorsize=sb.sectorsize,
+                                    csum_size=sb.csum_size)
 
         if args.verbose:
             print(f"  Extracted {len(entries)} entries", file=sys.stderr)
@@ -373,12 +449,10 @@ Offset formats:
 
         # Apply --recent filter: show N most recently accessed files
         if args.recent:
-            # Filter to files only (exclude directories, symlinks, etc.)
-            file_entries = [e for e in entries if e.type == 'file']
-            # Sort by atime descending (most recent first)
-            file_entries.sort(key=lambda e: e.atime, reverse=True)
-            # Take top N
-            entries = file_entries[:args.recent]
+            # Top N files (not directories, symlinks, etc.) by atime, most recent first.
+            # nlargest is O(M log N) and matches a stable reverse sort + slice.
+            entries = heapq.nlargest(args.recent, (e for e in entries if e.type == 'file'),
+                                     key=lambda e: e.atime)
             if args.verbose:
                 print(f"  Showing {len(entries)} most recently accessed files", file=sys.stderr)
 
@@ -394,30 +468,27 @@ Offset formats:
         else:
             stats_path = derive_stats_filename(args.image)
 
-        write_statistics_json(stats, stats_path)
-
-        if args.verbose:
-            print(f"Statistics written to {stats_path}", file=sys.stderr)
-            print(file=sys.stderr)
+        # Statistics and main output only read `entries`; write them
+        # concurrently. The future re-raises any worker exception on result()
+        stats_executor = ThreadPoolExecutor(max_workers=1)
+        stats_writer = stats_executor.submit(write_statistics_json, stats, stats_path)
+        stats_executor.shutdown(wait=False)
 
-        # Step 6: Generate output
-        if args.output == 'json':
-            output = to_json(entries)
-        elif args.output == 'csv':
-            output = to_csv(entries)
-        elif args.output == 'tree':
-            output = to_tree(entries)
-        else:
-            output = to_console(entries)
-
-        # Write output
+        # Step 6: Generate output, streamed straight to its destination
         if args.file:
-            with open(args.file, 'w') as f:
-                f.write(output)
-            if args.verbose:
-                print(f"Output written to {args.file}", file=sys.stderr)
+            write_output_file(entries, args.output, args.file, verified)
         else:
-            print(output)
+            write_output(entries, args.output, sys.stdout, verified)
+            print()
+
+        stats_written = stats_writer.result()
+
+        if args.verbose:
+            lines = [f"Statistics written to {stats_path}", ""] if stats_written else []
+            if args.file:
+                lines.append(f"Output written to {args.file}")
+            if lines:
+                sys.stderr.write('\n'.join(lines) + '\n')
 
         # Interactive file extraction mode
         if args.extract:
@@ -1,24 +1,57 @@
 """
 BTRFS Chunk Parser - Logical to physical address mapping.
 """
-import struct
-from typing import Dict, Optional, BinaryIO
-from structures import BtrfsKey, BtrfsChunk, BtrfsHeader, BtrfsItem, BTRFS_ITEM_SIZE
-from constants import HEADER_SIZE, BTRFS_TYPE
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Dict, Iterable, List, Optional, BinaryIO
+from structures import (BtrfsChunk, BTRFS_ITEM_SIZE, BTRFS_KEY_PTR_SIZE, KEY_STRUCT,
+                        ITEM_STRUCT, KEY_PTR_STRUCT, NODE_INFO_STRUCT, NODE_INFO_OFFSET)
+from constants import HEADER_SIZE, BTRFS_TYPE, BTRFS_OBJECTID
+
+# Granule size (as a shift) used by the translation cache in ChunkMap
+XLATE_SHIFT = 20  # 1 MiB
+
+# Bound on exact-address entries kept for granules that straddle chunks
+ADDR_CACHE_MAX = 65536
+
+# (objectid, type) of the last chunk items; leaf scans stop past it
+_LAST_CHUNK_KEY = (BTRFS_OBJECTID.FIRST_CHUNK_TREE, BTRFS_TYPE.CHUNK_ITEM)
 
 
 class ChunkMap:
     """Maps logical addresses to physical addresses."""
 
     def __init__(self):
-        # Dict of {logical_start: (length, physical_offset)}
-        self.chunks: Dict[int, tuple] = {}
+        # Chunks as parallel typed arrays kept sorted by logical start:
+        # chunk start, chunk end (exclusive) and physical - logical delta
+        self._starts = array('Q')
+        self._ends = array('Q')
+        self._deltas = array('q')
         # Partition offset for multi-partition images
         self.partition_offset: int = 0
+        # Translation cache: {logical_addr >> XLATE_SHIFT: physical - logical}
+        self._xlate_cache: Dict[int, int] = {}
+        # Same deltas for single addresses in granules that cross a chunk edge
+        self._addr_cache: Dict[int, int] = {}
 
     def add_chunk(self, logical_start: int, length: int, physical_offset: int):
-        """Add a chunk mapping."""
-        self.chunks[logical_start] = (length, physical_offset)
+        """Add a chunk mapping (replacing any chunk with the same start)."""
+        idx = bisect_left(self._starts, logical_start)
+        if idx < len(self._starts) and self._starts[idx] == logical_start:
+            self._ends[idx] = logical_start + length
+            self._deltas[idx] = physical_offset - logical_start
+        else:
+            self._starts.insert(idx, logical_start)
+            self._ends.insert(idx, logical_start + length)
+            self._deltas.insert(idx, physical_offset - logical_start)
+        self._xlate_cache.clear()
+        self._addr_cache.clear()
+
+    @property
+    def chunks(self) -> Dict[int, tuple]:
+        """Snapshot dict of {logical_start: (length, physical_offset)}, sorted by start."""
+        return {start: (end - start, start + delta)
+                for start, end, delta in zip(self._starts, self._ends, self._deltas)}
 
     def logical_to_physical(self, logical_addr: int) -> Optional[int]:
         """
@@ -26,18 +59,61 @@ class ChunkMap:
 
         Returns absolute offset in the image file (includes partition offset).
         """
-        for chunk_start, (length, physical_offset) in self.chunks.items():
-            if chunk_start <= logical_addr < chunk_start + length:
-                offset_in_chunk = logical_addr - chunk_start
-                # Add partition offset for absolute file position
-                return self.partition_offset + physical_offset + offset_in_chunk
-        return None
+        granule = logical_addr >> XLATE_SHIFT
+        delta = self._xlate_cache.get(granule)
+        if delta is None:
+            delta = self._addr_cache.get(logical_addr)
+        if delta is not None:
+            return self.partition_offset + logical_addr + delta
+
+        # The only candidate is the last chunk starting at or below the address
+        idx = bisect_right(self._starts, logical_addr) - 1
+        if idx < 0:
+            return None
+        chunk_end = self._ends[idx]
+        if logical_addr >= chunk_end:
+            return None
+        delta = self._deltas[idx]
+
+        # Cache the granule only if it lies entirely inside this chunk,
+        # otherwise just this address (tree blocks are looked up repeatedly)
+        if (self._starts[idx] <= granule << XLATE_SHIFT and
+                (granule + 1) << XLATE_SHIFT <= chunk_end):
+            self._xlate_cache[granule] = delta
+        else:
+            if len(self._addr_cache) >= ADDR_CACHE_MAX:
+                self._addr_cache.clear()
+            self._addr_cache[logical_addr] = delta
+
+        # Add partition offset for absolute file position
+        return self.partition_offset + logical_addr + delta
+
+    def logical_to_physical_batch(self, logical_addrs: Iterable[int]) -> List[Optional[int]]:
+        """
+        Convert many logical addresses at once; same results as calling
+        logical_to_physical() on each.
+
+        The addresses are visited in sorted order in one sweep over the
+        chunks, instead of a separate search per address.
+        """
+        logical_addrs = list(logical_addrs)
+        results: List[Optional[int]] = [None] * len(logical_addrs)
+        starts, ends, deltas = self._starts, self._ends, self._deltas
+        nchunks = len(starts)
+        idx = -1  # Last chunk starting at or below the current address
+        for i in sorted(range(len(logical_addrs)), key=logical_addrs.__getitem__):
+            logical_addr = logical_addrs[i]
+            while idx + 1 < nchunks and starts[idx + 1] <= logical_addr:
+                idx += 1
+            if idx >= 0 and logical_addr < ends[idx]:
+                results[i] = self.partition_offset + logical_addr + deltas[idx]
+        return results
 
     def __len__(self):
-        return len(self.chunks)
+        return len(self._starts)
 
     def __repr__(self):
-        return f"ChunkMap({len(self.chunks)} chunks, partition_offset=0x{self.partition_offset:x})"
+        return f"ChunkMap({len(self)} chunks, partition_offset=0x{self.partition_offset:x})"
 
 
 def parse_sys_chunk_array(sys_chunk_array: bytes, size: int) -> ChunkMap:
@@ -56,11 +132,9 @@ def parse_sys_chunk_array(sys_chunk_array: bytes, size: int) -> ChunkMap:
         if pos + 17 > size:
             break
 
-        key = BtrfsKey.unpack(sys_chunk_array, pos)
-        pos += 17
-
         # key.offset is the logical start address
-        logical_start = key.offset
+        logical_start = KEY_STRUCT.unpack_from(sys_chunk_array, pos)[2]
+        pos += 17
 
         # Read chunk item (need at least fixed header)
         if pos + 48 > size:
@@ -86,59 +160,63 @@ def read_chunk_tree(f: BinaryIO, chunk_tree_addr: int, chunk_map: ChunkMap,
     This is needed because sys_chunk_array only contains system chunks,
     but we need metadata and data chunks too.
     """
-    visited = set()
-
-    def traverse_chunk_tree(logical_addr: int):
-        if logical_addr in visited:
-            return
-        visited.add(logical_addr)
-
-        physical = chunk_map.logical_to_physical(logical_addr)
-        if physical is None:
-            return
-
-        f.seek(physical)
-        block = f.read(nodesize)
-
-        if len(block) < HEADER_SIZE:
-            return
-
-        header = BtrfsHeader.unpack(block)
-
-        if header.level == 0:
-            # Leaf node - parse CHUNK_ITEMs
-            item_pos = HEADER_SIZE
-            for i in range(header.nritems):
-                if item_pos + BTRFS_ITEM_SIZE > len(block):
+    # btree imports this module, so its reader is imported here (once per call)
+    from btree import read_at, read_tree_blocks
+
+    physical = chunk_map.logical_to_physical(chunk_tree_addr)
+    if physical is None:
+        return chunk_map
+
+    # One positioned read (mmap slice or os.pread) instead of seek + read
+    visited = {chunk_tree_addr}
+    stack = [read_at(f, physical, nodesize)]
+
+    # Explicit stack of blocks already read; children are pushed in reverse so
+    # blocks are still visited in the same depth-first, left-to-right order
+    while stack:
+        block = stack.pop()
+        if block is None or len(block) < HEADER_SIZE:
+            continue
+
+        nritems, level = NODE_INFO_STRUCT.unpack_from(block, NODE_INFO_OFFSET)
+
+        if level == 0:
+            # Leaf node - parse CHUNK_ITEMs. The item array (clamped to whole
+            # items inside the block) is unpacked in one iter_unpack pass and
+            # only CHUNK_ITEM entries reach the Python-level body. Keys are
+            # sorted, so nothing after (FIRST_CHUNK_TREE, CHUNK_ITEM) can match.
+            count = min(nritems, (len(block) - HEADER_SIZE) // BTRFS_ITEM_SIZE)
+            item_array = memoryview(block)[HEADER_SIZE:HEADER_SIZE + count * BTRFS_ITEM_SIZE]
+            chunk_items = []
+            for objectid, key_type, key_offset, data_offset, _ in ITEM_STRUCT.iter_unpack(item_array):
+                if key_type == BTRFS_TYPE.CHUNK_ITEM:
+                    chunk_items.append((key_offset, data_offset))
+                elif (objectid, key_type) > _LAST_CHUNK_KEY:
                     break
-
-                item = BtrfsItem.unpack(block, item_pos)
-
-                if item.key.type == BTRFS_TYPE.CHUNK_ITEM:
-                    # item.key.offset is the logical address
-                    logical_start = item.key.offset
-
-                    data_start = HEADER_SIZE + item.offset
-                    if data_start + 48 <= len(block):
-                        try:
-                            chunk = BtrfsChunk.unpack(block, data_start)
-                            if chunk.stripes:
-                                physical_offset = chunk.stripes[0][1]
-                                chunk_map.add_chunk(logical_start, chunk.length, physical_offset)
-                        except Exception:
-                            pass
-
-                item_pos += BTRFS_ITEM_SIZE
+            item_array.release()
+
+            for logical_start, data_offset in chunk_items:
+                # key.offset is the logical address
+                data_start = HEADER_SIZE + data_offset
+                if data_start + 48 <= len(block):
+                    try:
+                        chunk = BtrfsChunk.unpack(block, data_start)
+                        if chunk.stripes:
+                            physical_offset = chunk.stripes[0][1]
+                            chunk_map.add_chunk(logical_start, chunk.length, physical_offset)
+                    except Exception:
+                        pass
         else:
-            # Internal node - traverse children
-            from structures import BtrfsKeyPtr, BTRFS_KEY_PTR_SIZE
-            ptr_pos = HEADER_SIZE
-            for i in range(header.nritems):
-                if ptr_pos + BTRFS_KEY_PTR_SIZE > len(block):
-                    break
-                ptr = BtrfsKeyPtr.unpack(block, ptr_pos)
-                traverse_chunk_tree(ptr.blockptr)
-                ptr_pos += BTRFS_KEY_PTR_SIZE
+            # Internal node - queue children. As with leaves, the pointer
+            # array (clamped to whole pointers) is unpacked in one pass
+            count = min(nritems, (len(block) - HEADER_SIZE) // BTRFS_KEY_PTR_SIZE)
+            ptr_array = memoryview(block)[HEADER_SIZE:HEADER_SIZE + count * BTRFS_KEY_PTR_SIZE]
+            children = [ptr[3] for ptr in KEY_PTR_STRUCT.iter_unpack(ptr_array)]
+            ptr_array.release()
+            # Read all new children in one batch: adjacent blocks are
+            # coalesced into single preadv calls (or sliced from the mmap)
+            children = [addr for addr in dict.fromkeys(children) if addr not in visited]
+            visited.update(children)
+            stack.extend(reversed(read_tree_blocks(f, children, chunk_map, nodesize)))
 
-    traverse_chunk_tree(chunk_tree_addr)
     return chunk_map
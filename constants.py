@@ -138,17 +138,64 @@ class BTRFS_FT:
     XATTR = 8
 
 
-FT_NAMES = {
-    0: 'unknown',
-    1: 'file',
-    2: 'directory',
-    3: 'chrdev',
-    4: 'blkdev',
-    5: 'fifo',
-    6: 'socket',
-    7: 'symlink',
-    8: 'xattr'
-}
+# Indexed by BTRFS_FT value
+FT_NAMES = (
+    'unknown',    # 0
+    'file',       # 1
+    'directory',  # 2
+    'chrdev',     # 3
+    'blkdev',     # 4
+    'fifo',       # 5
+    'socket',     # 6
+    'symlink',    # 7
+    'xattr',      # 8
+)
+
+# File-type tables indexed by stat.S_IFMT(mode) >> 12 (16 possible values)
+_S_IFMT_SHIFT = 12
+
+
+def _ifmt_table(names: dict, default: str) -> tuple:
+    table = [default] * 16
+    for fmt, name in names.items():
+        table[fmt >> _S_IFMT_SHIFT] = name
+    return tuple(table)
+
+
+FILE_TYPE_NAMES = _ifmt_table({
+    stat.S_IFDIR: 'directory',
+    stat.S_IFREG: 'file',
+    stat.S_IFLNK: 'symlink',
+    stat.S_IFCHR: 'chrdev',
+    stat.S_IFBLK: 'blkdev',
+    stat.S_IFIFO: 'fifo',
+    stat.S_IFSOCK: 'socket',
+}, 'unknown')
+
+_FILE_TYPE_CHARS = _ifmt_table({
+    stat.S_IFREG: '-',
+    stat.S_IFDIR: 'd',
+    stat.S_IFLNK: 'l',
+    stat.S_IFBLK: 'b',
+    stat.S_IFCHR: 'c',
+    stat.S_IFIFO: 'p',
+    stat.S_IFSOCK: 's'
+}, '?')
+
+
+def _perm_string(mode: int) -> str:
+    perms = ''
+    for who in [(stat.S_IRUSR, stat.S_IWUSR, stat.S_IXUSR),
+                (stat.S_IRGRP, stat.S_IWGRP, stat.S_IXGRP),
+                (stat.S_IROTH, stat.S_IWOTH, stat.S_IXOTH)]:
+        perms += 'r' if mode & who[0] else '-'
+        perms += 'w' if mode & who[1] else '-'
+        perms += 'x' if mode & who[2] else '-'
+    return perms
+
+
+# 'rwxr-xr-x' style strings for every combination of the nine permission bits
+_PERM_STRINGS = tuple(_perm_string(m) for m in range(0o1000))
 
 
 class BTRFS_INODE_FLAGS:
@@ -167,57 +214,21 @@ class BTRFS_INODE_FLAGS:
     COMPRESS = 1 << 11      # Compress this file
 
 
+# (mask, name) for each inode flag, in display order
+_FLAG_TABLE = tuple((getattr(BTRFS_INODE_FLAGS, name), name) for name in (
+    'NODATASUM', 'NODATACOW', 'READONLY', 'NOCOMPRESS', 'PREALLOC', 'SYNC',
+    'IMMUTABLE', 'APPEND', 'NODUMP', 'NOATIME', 'DIRSYNC', 'COMPRESS'))
+
+
 def parse_inode_flags(flags: int) -> str:
     """Convert inode flags to comma-separated string."""
     if flags == 0:
         return ''
 
-    result = []
-    if flags & BTRFS_INODE_FLAGS.NODATASUM:
-        result.append('NODATASUM')
-    if flags & BTRFS_INODE_FLAGS.NODATACOW:
-        result.append('NODATACOW')
-    if flags & BTRFS_INODE_FLAGS.READONLY:
-        result.append('READONLY')
-    if flags & BTRFS_INODE_FLAGS.NOCOMPRESS:
-        result.append('NOCOMPRESS')
-    if flags & BTRFS_INODE_FLAGS.PREALLOC:
-        result.append('PREALLOC')
-    if flags & BTRFS_INODE_FLAGS.SYNC:
-        result.append('SYNC')
-    if flags & BTRFS_INODE_FLAGS.IMMUTABLE:
-        result.append('IMMUTABLE')
-    if flags & BTRFS_INODE_FLAGS.APPEND:
-        result.append('APPEND')
-    if flags & BTRFS_INODE_FLAGS.NODUMP:
-        result.append('NODUMP')
-    if flags & BTRFS_INODE_FLAGS.NOATIME:
-        result.append('NOATIME')
-    if flags & BTRFS_INODE_FLAGS.DIRSYNC:
-        result.append('DIRSYNC')
-    if flags & BTRFS_INODE_FLAGS.COMPRESS:
-        result.append('COMPRESS')
-
-    return ','.join(result)
+    return ','.join([name for mask, name in _FLAG_TABLE if flags & mask])
 
 
 def parse_mode(mode: int) -> str:
     """Convert mode integer to string like 'drwxr-xr-x'."""
-    file_type = {
-        stat.S_IFREG: '-',
-        stat.S_IFDIR: 'd',
-        stat.S_IFLNK: 'l',
-        stat.S_IFBLK: 'b',
-        stat.S_IFCHR: 'c',
-        stat.S_IFIFO: 'p',
-        stat.S_IFSOCK: 's'
-    }.get(stat.S_IFMT(mode), '?')
-
-    perms = ''
-    for who in [(stat.S_IRUSR, stat.S_IWUSR, stat.S_IXUSR),
-                (stat.S_IRGRP, stat.S_IWGRP, stat.S_IXGRP),
-                (stat.S_IROTH, stat.S_IWOTH, stat.S_IXOTH)]:
-        perms += 'r' if mode & who[0] else '-'
-        perms += 'w' if mode & who[1] else '-'
-        perms += 'x' if mode & who[2] else '-'
-    return file_type + perms
+    return (_FILE_TYPE_CHARS[stat.S_IFMT(mode) >> _S_IFMT_SHIFT] +
+            _PERM_STRINGS[mode & 0o777])
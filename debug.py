@@ -11,6 +11,12 @@ from btree import traverse_tree_all, read_tree_block
 from structures import BtrfsHeader
 from constants import BTRFS_TYPE, BTRFS_OBJECTID
 
+# Item key type names, indexed by type byte
+_KNOWN_TYPE_NAMES = {1: "INODE_ITEM", 12: "INODE_REF", 84: "DIR_ITEM",
+                     96: "DIR_INDEX", 132: "ROOT_ITEM", 144: "ROOT_BACKREF",
+                     156: "ROOT_REF", 228: "CHUNK_ITEM"}
+_TYPE_NAMES = tuple(_KNOWN_TYPE_NAMES.get(t, f"TYPE_{t}") for t in range(256))
+
 
 def parse_offset(value: str) -> int:
     """Parse offset value."""
@@ -104,16 +110,7 @@ def main():
 
             print("Item types found:")
             for t, count in sorted(type_counts.items()):
-                type_name = {
-                    1: "INODE_ITEM",
-                    12: "INODE_REF",
-                    84: "DIR_ITEM",
-                    96: "DIR_INDEX",
-                    132: "ROOT_ITEM",
-                    144: "ROOT_BACKREF",
-                    156: "ROOT_REF",
-                    228: "CHUNK_ITEM",
-                }.get(t, f"TYPE_{t}")
+                type_name = _TYPE_NAMES[t]
                 print(f"  {type_name} ({t}): {count}")
             print()
 
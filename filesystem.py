@@ -1,17 +1,28 @@
 """
 BTRFS Filesystem Parser - Extract files and directories from filesystem tree.
 """
-import struct
+import os
 import stat
+import struct
+import sys
+import weakref
 import hashlib
 import zlib
-from typing import Dict, List, Optional, BinaryIO
+from bisect import bisect_left, bisect_right
+from operator import attrgetter, itemgetter
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_all_start_methods, get_context
+from multiprocessing.util import Finalize
+from itertools import repeat
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, BinaryIO
 from dataclasses import dataclass, field
 
-from structures import BtrfsInodeItem, BtrfsDirItem, BtrfsSuperblock, BtrfsFileExtentItem
-from constants import BTRFS_TYPE, BTRFS_OBJECTID, parse_mode, parse_inode_flags
+from structures import BtrfsInodeItem, BtrfsDirItem, BtrfsSuperblock, BtrfsFileExtentItem, U16, U32, U64, DATACLASS_SLOTS
+from constants import BTRFS_TYPE, BTRFS_OBJECTID, FILE_TYPE_NAMES, parse_mode, parse_inode_flags
 from chunk import ChunkMap
-from btree import traverse_tree_all
+from btree import (iter_tree_raw_data, iter_tree_raw_items, iter_tree_items_from,
+                   open_image, map_image, read_at, read_ranges, copy_to_fd, prefetch_ranges)
 
 # Try to import compression modules (optional dependencies)
 try:
@@ -26,8 +37,31 @@ try:
 except ImportError:
     HAS_LZO = False
 
+try:
+    from google_crc32c import value as _crc32c_value
+    HAS_CRC32C = True
+except ImportError:
+    HAS_CRC32C = False
 
-@dataclass
+# Distinct raw names remembered per parse_filesystem() call; repeated
+# basenames then share one decoded str (interned, so snapshots parsed in
+# the same process share it too)
+NAME_CACHE_MAX = 65536
+
+# Largest piece iter_file_data() reads from the image at a time
+READ_CHUNK_SIZE = 1 << 20
+
+# Files hashed per worker-process task, and the fewest files worth
+# spreading over worker processes
+HASH_BATCH_FILES = 64
+PARALLEL_HASH_THRESHOLD = 256
+
+# Worker processes are started fresh rather than forked, so they do not
+# inherit the parent's open image or btree's running read threads
+_PROCESS_CONTEXT = get_context('forkserver' if 'forkserver' in get_all_start_methods() else 'spawn')
+
+
+@dataclass(**DATACLASS_SLOTS)
 class FileEntry:
     """Represents a file or directory extracted from BTRFS."""
     inode: int
@@ -63,6 +97,7 @@ class FileEntry:
     physical_offset: Optional[int] = None     # Raw disk offset (first extent)
     # Phase 4: Checksums
     checksum_count: int = 0                   # Number of checksums covering file
+    checksum_errors: Optional[int] = None     # Blocks failing CRC32C (only with verify)
     # Cryptographic hashes
     md5: Optional[str] = None                 # MD5 hash of file contents
     sha256: Optional[str] = None              # SHA256 hash of file contents
@@ -70,41 +105,126 @@ class FileEntry:
     unique_inode: Optional[int] = None
 
 
-@dataclass
+@dataclass(**DATACLASS_SLOTS)
 class FileSystem:
     """Holds parsed filesystem state."""
     inodes: Dict[int, BtrfsInodeItem] = field(default_factory=dict)
     names: Dict[int, str] = field(default_factory=dict)           # inode -> name
     parents: Dict[int, int] = field(default_factory=dict)         # inode -> parent_inode
-    children: Dict[int, List[int]] = field(default_factory=dict)  # inode -> [child_inodes]
+    children: Dict[int, List[int]] = field(default_factory=dict)  # inode -> [child_inodes], see build_children()
     dir_entries: Dict[int, List[BtrfsDirItem]] = field(default_factory=dict)
     xattrs: Dict[int, List[tuple]] = field(default_factory=dict)  # inode -> [(name, value)]
-    extents: Dict[int, List[tuple]] = field(default_factory=dict) # inode -> [(file_offset, disk_bytenr, disk_bytes, compression)]
-    checksums: Dict[int, int] = field(default_factory=dict)       # logical_offset -> checksum_count
-    xattrs: Dict[int, List[tuple]] = field(default_factory=dict)  # inode -> [(name, value)]
-    extents: Dict[int, List[tuple]] = field(default_factory=dict) # inode -> [(file_offset, disk_bytenr, disk_bytes, compression)]
+    extents: Dict[int, List[tuple]] = field(default_factory=dict) # inode -> [(file_offset, disk_bytenr, disk_bytes, compression, type, inline_data)]
     checksums: Dict[int, int] = field(default_factory=dict)       # logical_offset -> checksum_count
+    csum_data: Dict[int, bytes] = field(default_factory=dict)     # logical_offset -> raw CRC32C values
 
+    def build_children(self) -> Dict[int, List[int]]:
+        """
+        Fill `children` from `parents` and return it.
 
-def find_fs_tree_root(f: BinaryIO, sb: BtrfsSuperblock,
-                       chunk_map: ChunkMap) -> int:
-    """
-    Find the filesystem tree root from root tree.
-    Search for ROOT_ITEM with objectid=FS_TREE_OBJECTID (5).
+        Not done while parsing since nothing downstream needs it by default.
+        """
+        children: Dict[int, List[int]] = {}
+        for inode, parent in self.parents.items():
+            children.setdefault(parent, []).append(inode)
+        self.children = children
+        return children
+
+
+@dataclass
+class RootTreeScan:
+    """ROOT_ITEM and ROOT_REF contents of a root tree, from a single walk."""
+    first_roots: Dict[int, int]   # objectid -> bytenr of its first ROOT_ITEM
+    roots: Dict[int, int]         # objectid -> bytenr of its last ROOT_ITEM
+    names: Dict[int, str]         # child tree id -> name from ROOT_REF
+
+
+# Root tree scans per open image: {f: {(root, nodesize, partition_offset, nchunks): scan}}
+_ROOT_TREE_SCANS: 'weakref.WeakKeyDictionary' = weakref.WeakKeyDictionary()
+
+
+def _root_tree_scans(f: BinaryIO) -> Dict[tuple, RootTreeScan]:
+    """The remembered root tree scans of an open image."""
+    try:
+        return _ROOT_TREE_SCANS.setdefault(f, {})
+    except TypeError:
+        return {}  # Not weak-referenceable; scan without remembering
+
+
+def _root_tree_key(sb: BtrfsSuperblock, chunk_map: ChunkMap) -> tuple:
+    return (sb.root, sb.nodesize, chunk_map.partition_offset, len(chunk_map))
+
+
+def scan_root_tree(f: BinaryIO, sb: BtrfsSuperblock,
+                   chunk_map: ChunkMap) -> RootTreeScan:
     """
-    # Get all items from root tree
-    items = traverse_tree_all(f, sb.root, chunk_map, sb.nodesize)
+    Walk the root tree once, collecting ROOT_ITEM bytenrs and ROOT_REF names.
 
-    for item, data in items:
-        if (item.key.objectid == BTRFS_OBJECTID.FS_TREE and
-            item.key.type == BTRFS_TYPE.ROOT_ITEM):
+    The result is remembered per open image, so find_fs_tree_root(),
+    find_csum_tree_root() and find_all_subvolumes() share one walk.
+    """
+    key = _root_tree_key(sb, chunk_map)
+    scans = _root_tree_scans(f)
+    scan = scans.get(key)
+    if scan is not None:
+        return scan
+
+    scan = RootTreeScan({}, {}, {})
+    for objectid, item_type, offset, data in iter_tree_raw_data(f, sb.root, chunk_map, sb.nodesize):
+        if item_type == BTRFS_TYPE.ROOT_ITEM:
             # ROOT_ITEM contains bytenr at offset 176 (after embedded inode_item)
             # btrfs_root_item: inode(160) + generation(8) + root_dirid(8) + bytenr(8)
             if len(data) >= 184:
-                bytenr = struct.unpack_from('<Q', data, 176)[0]
-                return bytenr
+                bytenr = U64.unpack_from(data, 176)[0]
+                scan.first_roots.setdefault(objectid, bytenr)
+                scan.roots[objectid] = bytenr
+
+        elif item_type == BTRFS_TYPE.ROOT_REF:
+            # ROOT_REF: parent_objectid -> child info
+            # key.objectid = parent tree id
+            # key.offset = child tree id
+            # data: dirid(8) + sequence(8) + name_len(2) + name
+            child_id = offset
+            if len(data) >= 18:
+                name_len = U16.unpack_from(data, 16)[0]
+                if len(data) >= 18 + name_len:
+                    scan.names[child_id] = str(data[18:18+name_len], 'utf-8', 'replace')
 
-    raise ValueError("Filesystem tree root not found")
+    scans[key] = scan
+    return scan
+
+
+def _first_root_bytenr(f: BinaryIO, sb: BtrfsSuperblock, chunk_map: ChunkMap,
+                       objectid: int) -> Optional[int]:
+    """
+    bytenr of the first usable ROOT_ITEM of `objectid`.
+
+    Taken from the remembered root tree scan when there is one, otherwise
+    found with a keyed descent of the root tree instead of a full walk.
+    """
+    scan = _root_tree_scans(f).get(_root_tree_key(sb, chunk_map))
+    if scan is not None:
+        return scan.first_roots.get(objectid)
+
+    for (key_objectid, item_type, _), data in iter_tree_items_from(
+            f, sb.root, chunk_map, sb.nodesize, (objectid, BTRFS_TYPE.ROOT_ITEM, 0)):
+        if (key_objectid, item_type) != (objectid, BTRFS_TYPE.ROOT_ITEM):
+            break
+        if len(data) >= 184:
+            return U64.unpack_from(data, 176)[0]
+    return None
+
+
+def find_fs_tree_root(f: BinaryIO, sb: BtrfsSuperblock,
+                       chunk_map: ChunkMap) -> int:
+    """
+    Find the filesystem tree root from root tree.
+    Search for ROOT_ITEM with objectid=FS_TREE_OBJECTID (5).
+    """
+    bytenr = _first_root_bytenr(f, sb, chunk_map, BTRFS_OBJECTID.FS_TREE)
+    if bytenr is None:
+        raise ValueError("Filesystem tree root not found")
+    return bytenr
 
 
 def find_csum_tree_root(f: BinaryIO, sb: BtrfsSuperblock,
@@ -115,18 +235,9 @@ def find_csum_tree_root(f: BinaryIO, sb: BtrfsSuperblock,
     Returns None if checksum tree doesn't exist.
     """
     try:
-        items = traverse_tree_all(f, sb.root, chunk_map, sb.nodesize)
-
-        for item, data in items:
-            if (item.key.objectid == BTRFS_OBJECTID.CSUM_TREE and
-                item.key.type == BTRFS_TYPE.ROOT_ITEM):
-                if len(data) >= 184:
-                    bytenr = struct.unpack_from('<Q', data, 176)[0]
-                    return bytenr
+        return _first_root_bytenr(f, sb, chunk_map, BTRFS_OBJECTID.CSUM_TREE)
     except Exception:
-        pass
-
-    return None
+        return None
 
 
 def parse_checksum_tree(f: BinaryIO, sb: BtrfsSuperblock,
@@ -150,16 +261,14 @@ def parse_checksum_tree(f: BinaryIO, sb: BtrfsSuperblock,
     blocksize = sb.sectorsize  # Typically 4096 bytes per checksum
 
     try:
-        items = traverse_tree_all(f, csum_root, chunk_map, sb.nodesize)
-
-        for item, data in items:
-            if item.key.type == BTRFS_TYPE.EXTENT_CSUM:
+        # Only keys and item sizes are needed, so skip building item objects
+        for _, item_type, logical_start, _, size in iter_tree_raw_items(
+                f, csum_root, chunk_map, sb.nodesize):
+            if item_type == BTRFS_TYPE.EXTENT_CSUM:
                 # key.offset = starting logical byte offset
-                logical_start = item.key.offset
                 # Each checksum is 4 bytes (CRC32C), covers one block
-                num_checksums = len(data) // 4
                 # Store: logical_start -> num_checksums
-                checksums[logical_start] = num_checksums
+                checksums[logical_start] = size // 4
 
     except Exception:
         # If checksum tree parsing fails, return empty dict
@@ -168,6 +277,33 @@ def parse_checksum_tree(f: BinaryIO, sb: BtrfsSuperblock,
     return checksums
 
 
+def parse_checksum_data(f: BinaryIO, sb: BtrfsSuperblock,
+                        chunk_map: ChunkMap) -> Dict[int, bytes]:
+    """
+    Parse checksum tree and return map of logical_offset -> raw checksums.
+
+    Like parse_checksum_tree(), but keeps the 4-byte CRC32C values of each
+    EXTENT_CSUM item for verify_file_checksums().
+    """
+    csum_root = find_csum_tree_root(f, sb, chunk_map)
+    if not csum_root:
+        return {}
+
+    csum_data = {}
+
+    try:
+        for _, item_type, logical_start, data in iter_tree_raw_data(
+                f, csum_root, chunk_map, sb.nodesize):
+            if item_type == BTRFS_TYPE.EXTENT_CSUM:
+                csum_data[logical_start] = bytes(data)
+
+    except Exception:
+        # If checksum tree parsing fails, return what was read
+        pass
+
+    return csum_data
+
+
 def find_all_subvolumes(f: BinaryIO, sb: BtrfsSuperblock,
                         chunk_map: ChunkMap) -> List[tuple]:
     """
@@ -176,30 +312,11 @@ def find_all_subvolumes(f: BinaryIO, sb: BtrfsSuperblock,
     Returns list of (objectid, name, bytenr) tuples.
     Subvolumes have objectid >= 256 and have ROOT_ITEM entries.
     """
-    items = traverse_tree_all(f, sb.root, chunk_map, sb.nodesize)
+    scan = scan_root_tree(f, sb, chunk_map)
 
     subvolumes = []
-    root_items = {}  # objectid -> bytenr
-    root_names = {}  # objectid -> name
-
-    for item, data in items:
-        if item.key.type == BTRFS_TYPE.ROOT_ITEM:
-            objectid = item.key.objectid
-            if len(data) >= 184:
-                bytenr = struct.unpack_from('<Q', data, 176)[0]
-                root_items[objectid] = bytenr
-
-        elif item.key.type == BTRFS_TYPE.ROOT_REF:
-            # ROOT_REF: parent_objectid -> child info
-            # key.objectid = parent tree id
-            # key.offset = child tree id
-            # data: dirid(8) + sequence(8) + name_len(2) + name
-            child_id = item.key.offset
-            if len(data) >= 18:
-                name_len = struct.unpack_from('<H', data, 16)[0]
-                if len(data) >= 18 + name_len:
-                    name = data[18:18+name_len].decode('utf-8', errors='replace')
-                    root_names[child_id] = name
+    root_items = scan.roots  # objectid -> bytenr
+    root_names = scan.names  # objectid -> name
 
     # Build subvolume list
     for objectid, bytenr in root_items.items():
@@ -214,44 +331,92 @@ def find_all_subvolumes(f: BinaryIO, sb: BtrfsSuperblock,
     return subvolumes
 
 
+def _parse_subvolume(image, bytenr: int, chunk_map: ChunkMap,
+                     nodesize: int) -> Optional[FileSystem]:
+    """
+    Parse one subvolume tree, or return None if it fails to parse.
+
+    `image` is an open image, or a path when run in a worker process
+    (each worker then maps the image itself).
+    """
+    try:
+        if isinstance(image, str):
+            with open_image(image) as f:
+                return parse_filesystem(f, bytenr, chunk_map, nodesize)
+        return parse_filesystem(image, bytenr, chunk_map, nodesize)
+    except Exception:
+        return None
+
+
+def _parse_subvolume_trees(subvolumes: List[tuple], chunk_map: ChunkMap, nodesize: int,
+                           image_path: Optional[str]) -> Optional[List[Optional[FileSystem]]]:
+    """
+    Parse each subvolume's tree in parallel processes.
+
+    Returns None when that is not possible (no image path, a single CPU or
+    no process support); the trees are then parsed in-process.
+    """
+    roots = [bytenr for _, _, bytenr in subvolumes]
+    workers = min(len(roots), os.cpu_count() or 1)
+
+    if image_path is not None and workers > 1:
+        try:
+            with ProcessPoolExecutor(max_workers=workers, mp_context=_PROCESS_CONTEXT) as executor:
+                return list(executor.map(_parse_subvolume, repeat(image_path), roots,
+                                         repeat(chunk_map), repeat(nodesize)))
+        except (OSError, BrokenProcessPool):
+            pass  # No process support here; parse in-process instead
+
+    return None
+
+
+def _merge_subvolume(combined_fs: FileSystem, fs: FileSystem, objectid: int) -> None:
+    """Merge a separately parsed subvolume into the combined filesystem."""
+    # The unique inode combines subvolume id and original inode; the
+    # shifted subvolume id is computed once and each table is rekeyed in
+    # bulk rather than inode by inode.
+    base = objectid << 48
+    inodes = fs.inodes
+    combined_fs.inodes.update(
+        {base | inode: item for inode, item in inodes.items()})
+    combined_fs.names.update(
+        {base | inode: name for inode, name in fs.names.items()
+         if name and inode in inodes})
+    combined_fs.parents.update(
+        {base | inode: base | parent
+         for inode, parent in fs.parents.items() if inode in inodes})
+    combined_fs.extents.update(
+        {base | inode: extents for inode, extents in fs.extents.items()
+         if inode in inodes})
+    combined_fs.xattrs.update(
+        {base | inode: xattrs for inode, xattrs in fs.xattrs.items()
+         if inode in inodes})
+
+
 def parse_all_subvolumes(f: BinaryIO, sb: BtrfsSuperblock,
-                         chunk_map: ChunkMap) -> FileSystem:
+                         chunk_map: ChunkMap,
+                         image_path: Optional[str] = None) -> FileSystem:
     """
     Parse all subvolumes and combine into a single filesystem view.
+
+    Subvolume trees are independent, so when `image_path` is given they
+    are parsed by a pool of worker processes and merged afterwards.
+    Otherwise each tree is parsed straight into the combined view.
     """
     subvolumes = find_all_subvolumes(f, sb, chunk_map)
+    parsed = _parse_subvolume_trees(subvolumes, chunk_map, sb.nodesize, image_path)
 
     combined_fs = FileSystem()
 
-    for objectid, subvol_name, bytenr in subvolumes:
+    for i, (objectid, subvol_name, bytenr) in enumerate(subvolumes):
         try:
-            # Parse this subvolume's tree
-            fs = parse_filesystem(f, bytenr, chunk_map, sb.nodesize)
-
-            # Merge into combined filesystem with subvolume prefix
-            for inode, inode_item in fs.inodes.items():
-                # Create unique inode by combining subvolume id and original inode
-                unique_inode = (objectid << 48) | inode
-                combined_fs.inodes[unique_inode] = inode_item
-
-                # Update name with subvolume context
-                orig_name = fs.names.get(inode, '')
-                if orig_name:
-                    combined_fs.names[unique_inode] = orig_name
-
-                # Update parent reference
-                if inode in fs.parents:
-                    parent = fs.parents[inode]
-                    unique_parent = (objectid << 48) | parent
-                    combined_fs.parents[unique_inode] = unique_parent
-
-                # Update extents with unique_inode key
-                if inode in fs.extents:
-                    combined_fs.extents[unique_inode] = fs.extents[inode]
-
-                # Update xattrs with unique_inode key
-                if inode in fs.xattrs:
-                    combined_fs.xattrs[unique_inode] = fs.xattrs[inode]
+            if parsed is None:
+                parse_filesystem_into(f, bytenr, chunk_map, sb.nodesize,
+                                      combined_fs, subvol_id=objectid)
+            elif parsed[i] is not None:
+                _merge_subvolume(combined_fs, parsed[i], objectid)
+            else:
+                continue  # Skip subvolumes that fail to parse
 
             # Store subvolume root info
             # The root inode (256) of each subvolume
@@ -272,88 +437,127 @@ def parse_all_subvolumes(f: BinaryIO, sb: BtrfsSuperblock,
 def parse_filesystem(f: BinaryIO, fs_tree_root: int,
                      chunk_map: ChunkMap, nodesize: int) -> FileSystem:
     """Parse all inodes and directory entries from filesystem tree."""
-    fs = FileSystem()
-
-    items = traverse_tree_all(f, fs_tree_root, chunk_map, nodesize)
+    return parse_filesystem_into(f, fs_tree_root, chunk_map, nodesize, FileSystem())
 
-    for item, data in items:
-        objectid = item.key.objectid
-        item_type = item.key.type
 
-        try:
-            if item_type == BTRFS_TYPE.INODE_ITEM:
-                # Parse inode metadata
-                if len(data) >= 160:
-                    inode_item = BtrfsInodeItem.unpack(data)
-                    fs.inodes[objectid] = inode_item
-
-            elif item_type == BTRFS_TYPE.INODE_REF:
-                # Parse inode reference (name + parent)
-                # Format: index(8) + name_len(2) + name(variable)
-                if len(data) >= 10:
-                    name_len = struct.unpack_from('<H', data, 8)[0]
-                    if len(data) >= 10 + name_len:
-                        name = data[10:10+name_len].decode('utf-8', errors='replace')
-                        fs.names[objectid] = name
-                        fs.parents[objectid] = item.key.offset  # parent inode
-
-                        # Track children
-                        parent = item.key.offset
-                        if parent not in fs.children:
-                            fs.children[parent] = []
-                        fs.children[parent].append(objectid)
-
-            elif item_type == BTRFS_TYPE.DIR_ITEM:
-                # Parse directory entry
-                if len(data) >= 30:
-                    dir_item = BtrfsDirItem.unpack(data)
-                    if objectid not in fs.dir_entries:
-                        fs.dir_entries[objectid] = []
-                    fs.dir_entries[objectid].append(dir_item)
-
-            elif item_type == BTRFS_TYPE.XATTR_ITEM:
-                # Parse extended attribute (reuses DIR_ITEM structure)
-                if len(data) >= 30:
-                    xattr = BtrfsDirItem.unpack(data)
-                    if objectid not in fs.xattrs:
-                        fs.xattrs[objectid] = []
-                    # Store xattr name and data (if data_len > 0, data follows name)
-                    xattr_data = data[30+xattr.name_len:30+xattr.name_len+xattr.data_len] if xattr.data_len > 0 else b''
-                    fs.xattrs[objectid].append((xattr.name, xattr_data))
-
-            elif item_type == BTRFS_TYPE.EXTENT_DATA:
-                # Parse file extent data
-                if len(data) >= 21:
-                    extent = BtrfsFileExtentItem.unpack(data)
-                    if objectid not in fs.extents:
-                        fs.extents[objectid] = []
-
-                    # For inline extents (type=0), extract the inline data
-                    inline_data = None
-                    if extent.type == 0 and len(data) > 21:
-                        # Inline data starts after fixed header (21 bytes)
-                        inline_data = data[21:]
-
-                    # key.offset = file offset
-                    # Store: (file_offset, disk_bytenr, disk_num_bytes, compression, extent_type, inline_data)
-                    fs.extents[objectid].append((
-                        item.key.offset,
-                        extent.disk_bytenr,
-                        extent.disk_num_bytes,
-                        extent.compression,
-                        extent.type,
-                        inline_data
-                    ))
+def parse_filesystem_into(f: BinaryIO, fs_tree_root: int, chunk_map: ChunkMap,
+                          nodesize: int, fs: FileSystem,
+                          subvol_id: Optional[int] = None) -> FileSystem:
+    """
+    Parse a filesystem tree into an existing FileSystem and return it.
 
-        except Exception:
-            # Skip malformed items
+    With `subvol_id`, items are stored as they would appear in the combined
+    view of parse_all_subvolumes(): inodes become (subvol_id << 48) | inode,
+    only inodes with an INODE_ITEM keep their name, parent, xattrs and
+    extents, and directory entries are left out.
+    """
+    combined = subvol_id is not None
+    base = subvol_id << 48 if combined else 0
+    inodes = fs.inodes
+    name_cache: Dict[bytes, str] = {}
+
+    # Item types as locals: the dispatch below runs once per item, and this
+    # saves two attribute lookups per comparison
+    INODE_ITEM, INODE_REF = BTRFS_TYPE.INODE_ITEM, BTRFS_TYPE.INODE_REF
+    DIR_ITEM, XATTR_ITEM = BTRFS_TYPE.DIR_ITEM, BTRFS_TYPE.XATTR_ITEM
+    EXTENT_DATA = BTRFS_TYPE.EXTENT_DATA
+
+    # Keys come as plain (objectid, type, offset) values, decoded a leaf at a time
+    for objectid, item_type, key_offset, data in iter_tree_raw_data(
+            f, fs_tree_root, chunk_map, nodesize):
+        inode = base | objectid
+
+        # Every branch checks the item length before unpacking, so malformed
+        # items are skipped without an exception handler
+        if item_type == INODE_ITEM:
+            # Parse inode metadata
+            if len(data) >= 160:
+                inode_item = BtrfsInodeItem.unpack(data)
+                inodes[inode] = inode_item
+
+        elif combined and (item_type == DIR_ITEM or inode not in inodes):
+            # An inode's INODE_ITEM sorts before its other items
             continue
 
+        elif item_type == INODE_REF:
+            # Parse inode reference (name + parent)
+            # Format: index(8) + name_len(2) + name(variable)
+            if len(data) >= 10:
+                name_len = U16.unpack_from(data, 8)[0]
+                if len(data) >= 10 + name_len:
+                    # Key the cache by a bytes copy: a view as key would
+                    # keep its whole leaf alive for as long as the name is cached
+                    raw = bytes(data[10:10+name_len])
+                    name = name_cache.get(raw)
+                    if name is None:
+                        name = sys.intern(str(raw, 'utf-8', 'replace'))
+                        if len(name_cache) < NAME_CACHE_MAX:
+                            name_cache[raw] = name
+                    if name or not combined:
+                        fs.names[inode] = name
+                    else:
+                        fs.names.pop(inode, None)  # The combined view drops empty names
+                    fs.parents[inode] = base | key_offset  # parent inode
+
+        elif item_type == DIR_ITEM:
+            # Parse directory entry
+            if len(data) >= 30:
+                dir_item = BtrfsDirItem.unpack(data)
+                if objectid not in fs.dir_entries:
+                    fs.dir_entries[objectid] = []
+                fs.dir_entries[objectid].append(dir_item)
+
+        elif item_type == XATTR_ITEM:
+            # Parse extended attribute (reuses DIR_ITEM structure)
+            if len(data) >= 30:
+                xattr = BtrfsDirItem.unpack(data)
+                if inode not in fs.xattrs:
+                    fs.xattrs[inode] = []
+                # Store xattr name and data (if data_len > 0, data follows name)
+                xattr_data = bytes(data[30+xattr.name_len:30+xattr.name_len+xattr.data_len]) if xattr.data_len > 0 else b''
+                fs.xattrs[inode].append((xattr.name, xattr_data))
+
+        elif item_type == EXTENT_DATA:
+            # Parse file extent data
+            if len(data) >= 21:
+                extent = BtrfsFileExtentItem.unpack(data)
+                if inode not in fs.extents:
+                    fs.extents[inode] = []
+
+                # For inline extents (type=0), extract the inline data
+                inline_data = None
+                if extent.type == 0 and len(data) > 21:
+                    # Inline data starts after fixed header (21 bytes)
+                    inline_data = bytes(data[21:])
+
+                # key.offset = file offset
+                # Store: (file_offset, disk_bytenr, disk_num_bytes, compression, extent_type, inline_data)
+                fs.extents[inode].append((
+                    key_offset,
+                    extent.disk_bytenr,
+                    extent.disk_num_bytes,
+                    extent.compression,
+                    extent.type,
+                    inline_data
+                ))
+
     return fs
 
 
-def build_path(fs: FileSystem, inode: int, max_depth: int = 100) -> str:
-    """Build full path for an inode by walking up parent chain."""
+def build_path(fs: FileSystem, inode: int, max_depth: int = 100,
+               cache: Optional[Dict[int, Optional[tuple]]] = None) -> str:
+    """
+    Build full path for an inode by walking up parent chain.
+
+    With `cache` (a dict reused across calls with the same fs and
+    max_depth), each directory's path is built once and children just
+    append their name to it, instead of re-walking the whole chain.
+    """
+    if cache is not None:
+        path = _cached_path(fs, inode, max_depth, cache)
+        if path is not None:
+            return path
+
     parts = []
     current = inode
     depth = 0
@@ -395,24 +599,159 @@ def build_path(fs: FileSystem, inode: int, max_depth: int = 100) -> str:
         return '/' + '/'.join(parts) if parts else '/'
 
 
+# Cache entry for an inode with no name: the walk yields '/' with no parts
+_NO_PARTS = ('/', 0, '/', False)
+
+
+def _cached_path(fs: FileSystem, inode: int, max_depth: int,
+                 cache: Dict[int, Optional[tuple]]) -> Optional[str]:
+    """
+    Memoized build_path(); returns None where only the plain walk is exact.
+
+    cache maps inode -> (path, number of parts, prefix for children's paths,
+    whether the first part is a '/' subvolume root), or None when the walk
+    hits a cycle or max_depth and must be redone in full.
+    """
+    chain = []
+    on_chain = set()
+    current = inode
+    while True:
+        if current in cache:
+            entry = cache[current]
+            break
+        if current not in fs.names:
+            entry = _NO_PARTS
+            break
+        if current in on_chain or len(chain) >= max_depth:
+            entry = None  # Cycle or too deep
+            break
+
+        name = fs.names[current]
+        parent = fs.parents.get(current)
+        if name.startswith('/') or parent is None or parent == current:
+            # The walk stops at this inode; it's the only part
+            rooted = name.startswith('/')
+            path = name if rooted else '/' + name
+            entry = cache[current] = (path, 1, '/' if name == '/' else path + '/', rooted)
+            break
+
+        chain.append(current)
+        on_chain.add(current)
+        current = parent
+
+    # Extend the ancestor's path back down to `inode`
+    for node in reversed(chain):
+        if entry is not None and entry[1] < max_depth:
+            parent_path, nparts, prefix, rooted = entry
+            name = fs.names[node]
+            # build_path() drops an empty remainder after a subvolume root
+            path = parent_path if (rooted and nparts == 1 and not name) else prefix + name
+            entry = (path, nparts + 1, prefix + name + '/', rooted)
+        else:
+            entry = None
+        cache[node] = entry
+
+    return entry[0] if entry is not None else None
+
+
 def get_file_type(mode: int) -> str:
     """Determine file type from mode."""
-    if stat.S_ISDIR(mode):
-        return 'directory'
-    elif stat.S_ISREG(mode):
-        return 'file'
-    elif stat.S_ISLNK(mode):
-        return 'symlink'
-    elif stat.S_ISCHR(mode):
-        return 'chrdev'
-    elif stat.S_ISBLK(mode):
-        return 'blkdev'
-    elif stat.S_ISFIFO(mode):
-        return 'fifo'
-    elif stat.S_ISSOCK(mode):
-        return 'socket'
-    else:
-        return 'unknown'
+    return FILE_TYPE_NAMES[stat.S_IFMT(mode) >> 12]
+
+
+def _file_data_segments(extents: List[tuple], chunk_map: ChunkMap) -> Iterator[tuple]:
+    """
+    Yield the readable pieces of a file in file order.
+
+    Each piece is (data, physical_offset, length): inline extents carry
+    their decompressed data, regular extents the physical range to read,
+    and holes (sparse regions) have neither.
+    """
+    # Sort extents by file offset
+    for extent_info in sorted(extents or (), key=itemgetter(0)):
+        # Unpack extent (handle both old and new formats)
+        if len(extent_info) == 6:
+            file_offset, disk_bytenr, disk_num_bytes, compression, extent_type, inline_data = extent_info
+        else:
+            # Old format compatibility
+            file_offset, disk_bytenr, disk_num_bytes, compression = extent_info
+            extent_type = 1  # Assume regular extent
+            inline_data = None
+
+        # Handle inline extents (type=0)
+        if extent_type == 0 and inline_data:
+            # Inline data is embedded in the extent item
+            # Decompress if needed
+            decompressed = decompress_data(inline_data, compression)
+            if decompressed:
+                yield (decompressed, None, len(decompressed))
+            continue
+
+        # Holes are filled with zeros
+        if disk_bytenr == 0:
+            yield (None, None, disk_num_bytes)
+            continue
+
+        # Skip compressed extents (would need decompression)
+        if compression != 0:
+            continue
+
+        # Translate logical to physical address
+        physical_offset = chunk_map.logical_to_physical(disk_bytenr)
+        if not physical_offset:
+            continue
+
+        yield (None, physical_offset, disk_num_bytes)
+
+
+def iter_file_data(f: BinaryIO, extents: List[tuple], chunk_map: ChunkMap,
+                   max_size: int = 0) -> Iterator[bytes]:
+    """
+    Yield file data by following extent mappings.
+
+    Regular extents and holes are produced in pieces of at most
+    READ_CHUNK_SIZE bytes, so a large file is never held in memory at once.
+
+    Args:
+        f: Open file handle to disk image
+        extents: List of (file_offset, disk_bytenr, disk_num_bytes, compression, extent_type, inline_data)
+        chunk_map: ChunkMap for logical->physical translation
+        max_size: Maximum bytes to yield (0 = yield all)
+
+    Yields:
+        Consecutive pieces of the file data
+    """
+    remaining = max_size if max_size > 0 else None
+
+    for data, physical_offset, length in _file_data_segments(extents, chunk_map):
+        if remaining == 0:
+            return
+
+        if data is not None:
+            if remaining is not None:
+                data = data[:remaining]
+                remaining -= len(data)
+            yield data
+            continue
+
+        if remaining is not None:
+            length = min(length, remaining)
+        done = 0
+        while done < length:
+            size = min(READ_CHUNK_SIZE, length - done)
+            if physical_offset is None:
+                data = bytes(size)
+            else:
+                try:
+                    data = read_at(f, physical_offset + done, size)
+                except Exception:
+                    break
+                if not data:
+                    break  # End of image
+            done += len(data)
+            if remaining is not None:
+                remaining -= len(data)
+            yield data
 
 
 def read_file_data(f: BinaryIO, extents: List[tuple], chunk_map: ChunkMap,
@@ -420,6 +759,10 @@ def read_file_data(f: BinaryIO, extents: List[tuple], chunk_map: ChunkMap,
     """
     Read file data by following extent mappings.
 
+    All regular extents are read up front in one read_ranges() batch,
+    rather than one seek and read per extent, and assembled into a single
+    preallocated buffer.
+
     Args:
         f: Open file handle to disk image
         extents: List of (file_offset, disk_bytenr, disk_num_bytes, compression, extent_type, inline_data)
@@ -429,15 +772,78 @@ def read_file_data(f: BinaryIO, extents: List[tuple], chunk_map: ChunkMap,
     Returns:
         File data as bytes
     """
-    if not extents:
-        return b''
+    segments = []
+    ranges = []
+    planned = 0
+    for data, physical_offset, length in _file_data_segments(extents, chunk_map):
+        if max_size > 0:
+            if planned >= max_size:
+                break
+            length = min(length, max_size - planned)  # Don't read past max_size
+        if data is None and physical_offset is not None:
+            ranges.append((physical_offset, length))
+        segments.append((data, physical_offset, length))
+        planned += length
 
-    # Sort extents by file offset
-    sorted_extents = sorted(extents, key=lambda e: e[0])
+    try:
+        extent_data = iter(read_ranges(f, ranges))
+    except Exception:
+        # Fall back to reading extent by extent, skipping unreadable ones
+        return b''.join(iter_file_data(f, extents, chunk_map, max_size))
+
+    # Assemble in one zero-filled buffer: holes are just skipped over
+    file_data = bytearray(planned)
+    pos = 0
+    for data, physical_offset, length in segments:
+        if data is None:
+            if physical_offset is None:
+                pos += length
+                continue
+            data = next(extent_data)
+        n = min(len(data), length)
+        file_data[pos:pos + n] = data[:n] if n < len(data) else data
+        pos += n
+
+    # A short read at the end of the image leaves the tail unused
+    del file_data[pos:]
+    return bytes(file_data)
+
+
+def read_file_data_to_fd(f: BinaryIO, extents: List[tuple], chunk_map: ChunkMap,
+                         out_fd: int, max_size: int = 0) -> int:
+    """
+    Write file data to an open descriptor by following extent mappings.
+
+    Produces the same bytes as read_file_data(), but uncompressed regular
+    extents are copied from the image with copy_to_fd() instead of being
+    collected in memory first.
 
-    file_data = bytearray()
+    Args:
+        f: Open file handle to disk image
+        extents: List of (file_offset, disk_bytenr, disk_num_bytes, compression, extent_type, inline_data)
+        chunk_map: ChunkMap for logical->physical translation
+        out_fd: Destination file descriptor
+        max_size: Maximum bytes to write (0 = write all)
+
+    Returns:
+        Number of bytes written
+    """
+    written = 0
+
+    def emit(data):
+        nonlocal written
+        if max_size > 0:
+            data = data[:max_size - written]
+        view = memoryview(data)
+        done = 0
+        while done < len(view):
+            done += os.write(out_fd, view[done:])
+        written += done
+
+    for extent_info in sorted(extents or (), key=itemgetter(0)):
+        if max_size > 0 and written >= max_size:
+            break
 
-    for extent_info in sorted_extents:
         # Unpack extent (handle both old and new formats)
         if len(extent_info) == 6:
             file_offset, disk_bytenr, disk_num_bytes, compression, extent_type, inline_data = extent_info
@@ -447,47 +853,107 @@ def read_file_data(f: BinaryIO, extents: List[tuple], chunk_map: ChunkMap,
             extent_type = 1  # Assume regular extent
             inline_data = None
 
-        # Handle inline extents (type=0)
+        # Inline extents are small and may need decompression
         if extent_type == 0 and inline_data:
-            # Inline data is embedded in the extent item
-            # Decompress if needed
             decompressed = decompress_data(inline_data, compression)
             if decompressed:
-                file_data.extend(decompressed)
+                emit(decompressed)
             continue
 
-        # Skip holes (sparse regions) for regular extents
+        # Fill holes (sparse regions) with zeros
         if disk_bytenr == 0:
-            # Fill with zeros for hole
-            file_data.extend(b'\x00' * disk_num_bytes)
+            emit(b'\x00' * disk_num_bytes)
             continue
 
         # Skip compressed extents (would need decompression)
         if compression != 0:
             continue
 
-        # Translate logical to physical address
         physical_offset = chunk_map.logical_to_physical(disk_bytenr)
         if not physical_offset:
             continue
 
-        # Read extent data
+        length = disk_num_bytes
+        if max_size > 0:
+            length = min(length, max_size - written)
         try:
-            f.seek(physical_offset)
-            extent_data = f.read(disk_num_bytes)
-            file_data.extend(extent_data)
+            written += copy_to_fd(f, physical_offset, length, out_fd)
         except Exception:
             continue
 
-        # Stop if we've read enough
-        if max_size > 0 and len(file_data) >= max_size:
-            break
+    return written
 
-    # Truncate to max_size if specified
-    if max_size > 0 and len(file_data) > max_size:
-        file_data = file_data[:max_size]
 
-    return bytes(file_data)
+def prefetch_file_data(f: BinaryIO, extents: List[tuple], chunk_map: ChunkMap) -> None:
+    """
+    Hint the kernel to start reading the on-disk extents of a file.
+
+    Only uncompressed regular extents are hinted, as those are the ones
+    read_file_data() and read_file_data_to_fd() copy from the image.
+    """
+    ranges = []
+    for extent_info in extents or ():
+        disk_bytenr, disk_num_bytes, compression = extent_info[1:4]
+        extent_type = extent_info[4] if len(extent_info) == 6 else 1
+        if extent_type == 0 or disk_bytenr == 0 or compression != 0:
+            continue
+        physical_offset = chunk_map.logical_to_physical(disk_bytenr)
+        if physical_offset:
+            ranges.append((physical_offset, disk_num_bytes))
+    prefetch_ranges(f, ranges)
+
+
+# Shared zstd decompression context, created on first use
+_ZSTD_DCTX = None
+
+# BTRFS LZO framing: length field size, sector the segment headers are
+# aligned within, and the largest decompressed segment accepted
+LZO_LEN = 4
+LZO_SECTOR_SIZE = 4096
+LZO_SEGMENT_MAX = 65536
+
+
+def _decompress_zlib(data: bytes) -> Optional[bytes]:
+    return zlib.decompress(data)
+
+
+def _decompress_lzo(data: bytes) -> Optional[bytes]:
+    """
+    Decompress BTRFS LZO framing: total length(4), then segments of
+    length(4) + raw LZO1X data, each decompressing to at most one sector.
+    A segment header never straddles a sector boundary; the gap is padding.
+    """
+    if not HAS_LZO:
+        return None
+
+    total = min(U32.unpack_from(data, 0)[0], len(data))
+    pos = LZO_LEN
+    out = []
+    while pos < total:
+        if LZO_SECTOR_SIZE - pos % LZO_SECTOR_SIZE < LZO_LEN:
+            pos += LZO_SECTOR_SIZE - pos % LZO_SECTOR_SIZE
+            continue
+        seg_len = U32.unpack_from(data, pos)[0]
+        pos += LZO_LEN
+        # Raw stream without python-lzo's own header
+        out.append(lzo.decompress(bytes(data[pos:pos + seg_len]), False, LZO_SEGMENT_MAX))
+        pos += seg_len
+    return b''.join(out)
+
+
+def _decompress_zstd(data: bytes) -> Optional[bytes]:
+    global _ZSTD_DCTX
+    if not HAS_ZSTD:
+        return None
+    if _ZSTD_DCTX is None:
+        _ZSTD_DCTX = zstd.ZstdDecompressor()
+    # Kernel-written frames do not record their content size, which
+    # ZstdDecompressor.decompress() needs; a decompressobj streams instead
+    return _ZSTD_DCTX.decompressobj().decompress(data)
+
+
+# Decompressors indexed by compression type - 1 (1=zlib, 2=lzo, 3=zstd)
+_DECOMPRESSORS = (_decompress_zlib, _decompress_lzo, _decompress_zstd)
 
 
 def decompress_data(data: bytes, compression: int) -> Optional[bytes]:
@@ -505,33 +971,42 @@ def decompress_data(data: bytes, compression: int) -> Optional[bytes]:
         # No compression
         return data
 
-    elif compression == 1:
-        # ZLIB compression
-        try:
-            return zlib.decompress(data)
-        except Exception:
-            return None
+    if not 0 < compression <= len(_DECOMPRESSORS):
+        return None
 
-    elif compression == 2:
-        # LZO compression
-        if not HAS_LZO:
-            return None
-        try:
-            return lzo.decompress(data)
-        except Exception:
-            return None
+    try:
+        return _DECOMPRESSORS[compression - 1](data)
+    except Exception:
+        return None
 
-    elif compression == 3:
-        # ZSTD compression
-        if not HAS_ZSTD:
-            return None
-        try:
-            dctx = zstd.ZstdDecompressor()
-            return dctx.decompress(data)
-        except Exception:
-            return None
 
-    return None
+def _new_hash(name: str):
+    """Create a hashlib object; content hashes are not used for security."""
+    try:
+        return hashlib.new(name, usedforsecurity=False)
+    except TypeError:
+        return hashlib.new(name)  # Python < 3.9
+
+
+def hash_chunks(chunks: Iterable[bytes]) -> tuple:
+    """
+    Calculate MD5 and SHA256 hashes over a stream of data pieces.
+
+    Returns:
+        (md5_hex, sha256_hex), or (None, None) if there was no data
+    """
+    md5 = _new_hash('md5')
+    sha256 = _new_hash('sha256')
+    total = 0
+    for chunk in chunks:
+        md5.update(chunk)
+        sha256.update(chunk)
+        total += len(chunk)
+
+    if not total:
+        return (None, None)
+
+    return (md5.hexdigest(), sha256.hexdigest())
 
 
 def calculate_hashes(data: bytes) -> tuple:
@@ -541,13 +1016,184 @@ def calculate_hashes(data: bytes) -> tuple:
     Returns:
         (md5_hex, sha256_hex)
     """
-    if not data:
+    return hash_chunks((data,))
+
+
+def _crc32c_tables() -> tuple:
+    """Slicing-by-8 tables: tables[k][b] is the CRC of byte b followed by k zero bytes."""
+    table = []
+    for i in range(256):
+        crc = i
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0x82F63B78 if crc & 1 else crc >> 1
+        table.append(crc)
+    tables = [tuple(table)]
+    for _ in range(7):
+        prev = tables[-1]
+        tables.append(tuple((c >> 8) ^ table[c & 0xFF] for c in prev))
+    return tuple(tables)
+
+
+# Tables for the pure Python fallback, which consumes 8 bytes per step
+_CRC32C_TABLES = () if HAS_CRC32C else _crc32c_tables()
+
+
+# Two little-endian words: one slicing-by-8 step
+U32_PAIR = struct.Struct('<II')
+
+
+def crc32c(data: bytes) -> int:
+    """
+    CRC32C (Castagnoli) of data, as stored in BTRFS checksum items.
+
+    Uses google-crc32c (hardware accelerated) when installed; the pure
+    Python slicing-by-8 fallback is correct but still orders of magnitude
+    slower (see HAS_CRC32C).
+    """
+    if HAS_CRC32C:
+        return _crc32c_value(bytes(data))
+
+    t0, t1, t2, t3, t4, t5, t6, t7 = _CRC32C_TABLES
+    crc = 0xFFFFFFFF
+    tail = len(data) & ~7
+    for lo, hi in U32_PAIR.iter_unpack(data[:tail]):
+        lo ^= crc
+        crc = (t7[lo & 0xFF] ^ t6[(lo >> 8) & 0xFF] ^ t5[(lo >> 16) & 0xFF] ^ t4[lo >> 24] ^
+               t3[hi & 0xFF] ^ t2[(hi >> 8) & 0xFF] ^ t1[(hi >> 16) & 0xFF] ^ t0[hi >> 24])
+    for byte in data[tail:]:
+        crc = t0[(crc ^ byte) & 0xFF] ^ (crc >> 8)
+    return crc ^ 0xFFFFFFFF
+
+
+def verify_file_checksums(f: BinaryIO, extents: List[tuple], chunk_map: ChunkMap,
+                          csum_starts: List[int], csum_data: Dict[int, bytes],
+                          sectorsize: int = 4096, csum_size: int = 4,
+                          extent_errors: Optional[Dict[tuple, int]] = None) -> int:
+    """
+    Check a file's on-disk extents against the checksum tree.
+
+    Every sector of a regular extent that has a checksum is read as stored
+    on disk (still compressed, if it is) and its CRC32C compared with the
+    recorded value.
+
+    Args:
+        csum_starts: Sorted keys of csum_data
+        csum_data: logical_offset -> raw checksums (see parse_checksum_data())
+        sectorsize: Data bytes covered by one checksum (sb.sectorsize)
+        csum_size: Bytes per stored checksum (sb.csum_size)
+        extent_errors: (disk_bytenr, disk_num_bytes) -> mismatches, shared
+            across calls so extents referenced by several files (reflinks,
+            snapshots) are read and checked only once
+
+    Returns:
+        Number of blocks whose checksum does not match
+    """
+    errors = 0
+    for extent_info in extents or ():
+        disk_bytenr, disk_num_bytes = extent_info[1:3]
+        extent_type = extent_info[4] if len(extent_info) == 6 else 1
+        if extent_type == 0 or disk_bytenr == 0:
+            continue  # Inline extents and holes have no data checksums
+
+        if extent_errors is not None:
+            cached = extent_errors.get((disk_bytenr, disk_num_bytes))
+            if cached is not None:
+                errors += cached
+                continue
+
+        physical_offset = chunk_map.logical_to_physical(disk_bytenr)
+        if not physical_offset:
+            continue
+
+        extent_start_errors = errors
+        done = 0
+        while done < disk_num_bytes:
+            data = read_at(f, physical_offset + done, min(READ_CHUNK_SIZE, disk_num_bytes - done))
+            if not data:
+                break  # End of image
+            for pos in range(0, len(data) - sectorsize + 1, sectorsize):
+                logical = disk_bytenr + done + pos
+                i = bisect_right(csum_starts, logical) - 1
+                if i < 0:
+                    continue
+                start = csum_starts[i]
+                index = (logical - start) // sectorsize * csum_size
+                # CRC32C fills the first 4 bytes of its checksum slot
+                expected = csum_data[start][index:index + 4]
+                if len(expected) < 4:
+                    continue  # Block not covered by a checksum
+                if crc32c(data[pos:pos + sectorsize]) != int.from_bytes(expected, 'little'):
+                    errors += 1
+            done += len(data)
+
+        if extent_errors is not None:
+            extent_errors[(disk_bytenr, disk_num_bytes)] = errors - extent_start_errors
+
+    return errors
+
+
+# Image and chunk map of a hashing worker process (see _init_hash_worker())
+_WORKER_IMAGE: Optional[BinaryIO] = None
+_WORKER_CHUNK_MAP: Optional[ChunkMap] = None
+
+
+def _close_worker_image(raw: BinaryIO, mm) -> None:
+    """Unmap and close a worker's image as the worker process exits."""
+    if mm is not None:
+        try:
+            mm.close()
+        except BufferError:
+            pass  # A view is still held; the OS unmaps it at exit
+    raw.close()
+
+
+def _init_hash_worker(image_path: str, chunk_map: ChunkMap) -> None:
+    """
+    Pool initializer: open and map the image once per hashing worker.
+
+    Closed again by a multiprocessing Finalize, which (unlike atexit) runs
+    when a pool worker exits.
+    """
+    global _WORKER_IMAGE, _WORKER_CHUNK_MAP
+    raw = open(image_path, 'rb')
+    mm = map_image(raw)
+    _WORKER_IMAGE = raw if mm is None else mm
+    _WORKER_CHUNK_MAP = chunk_map
+    Finalize(None, _close_worker_image, (raw, mm), exitpriority=10)
+
+
+def _hash_file(image: BinaryIO, extents: List[tuple], chunk_map: ChunkMap,
+               size: int) -> tuple:
+    """Hash one file's data, or return (None, None) if it fails to read."""
+    try:
+        return hash_chunks(iter_file_data(image, extents, chunk_map, size))
+    except Exception:
         return (None, None)
 
-    md5_hash = hashlib.md5(data).hexdigest()
-    sha256_hash = hashlib.sha256(data).hexdigest()
 
-    return (md5_hash, sha256_hash)
+def _hash_file_in_worker(extents: List[tuple], size: int) -> tuple:
+    """_hash_file() against the image opened by _init_hash_worker()."""
+    return _hash_file(_WORKER_IMAGE, extents, _WORKER_CHUNK_MAP, size)
+
+
+def _hash_files(f: BinaryIO, jobs: List[tuple], chunk_map: ChunkMap,
+                image_path: Optional[str]) -> List[tuple]:
+    """Hash each (extents, size) job, in parallel processes when worthwhile."""
+    workers = min(-(-len(jobs) // HASH_BATCH_FILES), os.cpu_count() or 1)
+
+    if image_path is not None and workers > 1 and len(jobs) >= PARALLEL_HASH_THRESHOLD:
+        try:
+            with ProcessPoolExecutor(max_workers=workers, mp_context=_PROCESS_CONTEXT,
+                                     initializer=_init_hash_worker,
+                                     initargs=(image_path, chunk_map)) as executor:
+                return list(executor.map(_hash_file_in_worker,
+                                         (extents for extents, _ in jobs),
+                                         (size for _, size in jobs),
+                                         chunksize=HASH_BATCH_FILES))
+        except (OSError, BrokenProcessPool):
+            pass  # No process support here; hash in-process instead
+
+    return [_hash_file(f, extents, chunk_map, size) for extents, size in jobs]
 
 
 def parse_passwd_data(data: bytes) -> Dict[int, str]:
@@ -572,7 +1218,7 @@ def parse_passwd_data(data: bytes) -> Dict[int, str]:
             if not line or line.startswith('#'):
                 continue
 
-            parts = line.split(':')
+            parts = line.split(':', 3)  # Only the first three fields are used
             if len(parts) >= 3:
                 username = parts[0]
                 try:
@@ -608,7 +1254,7 @@ def parse_group_data(data: bytes) -> Dict[int, str]:
             if not line or line.startswith('#'):
                 continue
 
-            parts = line.split(':')
+            parts = line.split(':', 3)  # Only the first three fields are used
             if len(parts) >= 3:
                 groupname = parts[0]
                 try:
@@ -623,7 +1269,8 @@ def parse_group_data(data: bytes) -> Dict[int, str]:
 
 
 def resolve_names_from_filesystem(fs: FileSystem, chunk_map: Optional[ChunkMap],
-                                   disk_file: Optional[BinaryIO]) -> tuple:
+                                   disk_file: Optional[BinaryIO],
+                                   path_cache: Optional[dict] = None) -> tuple:
     """
     Extract and parse /etc/passwd and /etc/group from the filesystem.
 
@@ -635,6 +1282,7 @@ def resolve_names_from_filesystem(fs: FileSystem, chunk_map: Optional[ChunkMap],
         fs: Parsed FileSystem object
         chunk_map: ChunkMap for logical->physical translation
         disk_file: Open file handle to disk image
+        path_cache: Optional build_path() cache to share with the caller
 
     Returns:
         Tuple of (uid_map, gid_map) where each is a dict mapping id->name
@@ -654,7 +1302,7 @@ def resolve_names_from_filesystem(fs: FileSystem, chunk_map: Optional[ChunkMap],
     group_inode = None
 
     for unique_inode, name in fs.names.items():
-        path = build_path(fs, unique_inode)
+        path = build_path(fs, unique_inode, cache=path_cache)
 
         # Check all possible passwd locations
         if path in passwd_paths and passwd_inode is None:
@@ -686,45 +1334,75 @@ def resolve_names_from_filesystem(fs: FileSystem, chunk_map: Optional[ChunkMap],
 
 
 def extract_files(fs: FileSystem, chunk_map: Optional[ChunkMap] = None,
-                  disk_file: Optional[BinaryIO] = None) -> List[FileEntry]:
-    """Convert parsed filesystem to list of FileEntry objects."""
+                  disk_file: Optional[BinaryIO] = None,
+                  image_path: Optional[str] = None,
+                  verify: bool = False, sectorsize: int = 4096,
+                  csum_size: int = 4) -> List[FileEntry]:
+    """
+    Convert parsed filesystem to list of FileEntry objects.
+
+    File contents are hashed after all entries are built; when
+    `image_path` is given, large batches are hashed by a pool of worker
+    processes. With `verify`, each file's data blocks are also checked
+    against fs.csum_data (see parse_checksum_data()), one checksum of
+    `csum_size` bytes per `sectorsize` bytes, and the number of mismatches
+    stored in checksum_errors.
+    """
     entries = []
+    hash_jobs = []  # [(entry, extents, size)] for regular files with data
+
+    # Paths are built once per directory and shared by its entries
+    path_cache = {}
+
+    # A few dozen distinct modes cover a whole filesystem: decode each once
+    # and share the resulting type and mode strings between entries
+    mode_cache: Dict[int, Tuple[str, str]] = {}
 
     # Resolve user and group names from /etc/passwd and /etc/group
-    uid_map, gid_map = resolve_names_from_filesystem(fs, chunk_map, disk_file)
+    uid_map, gid_map = resolve_names_from_filesystem(fs, chunk_map, disk_file, path_cache)
+
+    # Checksum ranges sorted by logical start, so each extent only visits
+    # the ranges that can overlap it instead of the whole table
+    csum_starts = sorted(fs.checksums)
+    csum_ends = [start + fs.checksums[start] * 4096 for start in csum_starts]  # Assume 4K per checksum
+    max_csum_span = max((end - start for start, end in zip(csum_starts, csum_ends)), default=0)
+    csum_data_starts = sorted(fs.csum_data) if verify and disk_file and chunk_map else None
+    extent_errors: Dict[tuple, int] = {}  # Verified extents, shared between files
+
+    # Physical offsets of every file's first extent, translated in one batch
+    first_physical: Dict[int, Optional[int]] = {}
+    if chunk_map:
+        first_logical = {inode: extents[0][1] for inode, extents in fs.extents.items()
+                         if extents and extents[0][1] > 0}  # Skip holes/sparse extents
+        first_physical = dict(zip(first_logical,
+                                  chunk_map.logical_to_physical_batch(first_logical.values())))
 
     # Helper function to count checksums for a file's extents
     def count_checksums(unique_inode: int) -> int:
         """Count how many checksums cover this file's extents."""
-        if unique_inode not in fs.extents or not fs.checksums:
+        if unique_inode not in fs.extents or not csum_starts:
             return 0
 
         total_checksums = 0
         for extent_info in fs.extents[unique_inode]:
-            # Unpack extent (handle both old and new formats)
-            if len(extent_info) == 6:
-                file_offset, disk_bytenr, disk_bytes, compression, extent_type, inline_data = extent_info
-            else:
-                file_offset, disk_bytenr, disk_bytes, compression = extent_info
+            disk_bytenr = extent_info[1]
+            disk_bytes = extent_info[2]
 
             if disk_bytenr == 0:  # Skip holes/sparse/inline extents
                 continue
 
             # Find checksums that overlap with this extent
-            # Checksums are indexed by logical offset (disk_bytenr)
-            for csum_start, csum_count in fs.checksums.items():
-                csum_end = csum_start + (csum_count * 4096)  # Assume 4K per checksum
-                extent_end = disk_bytenr + disk_bytes
-
-                # Check if ranges overlap
-                if disk_bytenr < csum_end and extent_end > csum_start:
-                    # Calculate overlap
-                    overlap_start = max(disk_bytenr, csum_start)
-                    overlap_end = min(extent_end, csum_end)
-                    overlap_bytes = overlap_end - overlap_start
-                    if overlap_bytes > 0:
-                        # Count checksums in overlap (one per 4K block)
-                        total_checksums += (overlap_bytes + 4095) // 4096
+            # Checksums are indexed by logical offset (disk_bytenr); no range
+            # starting before disk_bytenr - max_csum_span can reach it
+            extent_end = disk_bytenr + disk_bytes
+            lo = bisect_right(csum_starts, disk_bytenr - max_csum_span)
+            hi = bisect_left(csum_starts, extent_end)
+            for i in range(lo, hi):
+                csum_end = csum_ends[i]
+                if disk_bytenr < csum_end:
+                    # Count checksums in overlap (one per 4K block)
+                    overlap_bytes = min(extent_end, csum_end) - max(disk_bytenr, csum_starts[i])
+                    total_checksums += (overlap_bytes + 4095) // 4096
 
         return total_checksums
 
@@ -734,9 +1412,12 @@ def extract_files(fs: FileSystem, chunk_map: Optional[ChunkMap] = None,
         subvol_id = unique_inode >> 48
 
         name = fs.names.get(unique_inode, '(unknown)')
-        path = build_path(fs, unique_inode)
+        path = build_path(fs, unique_inode, cache=path_cache)
         mode = inode_item.mode
-        file_type = get_file_type(mode)
+        mode_info = mode_cache.get(mode)
+        if mode_info is None:
+            mode_info = mode_cache[mode] = (get_file_type(mode), parse_mode(mode))
+        file_type, mode_str = mode_info
 
         # Skip entries with placeholder names at root
         if name == '(unknown)' and path == '/':
@@ -750,7 +1431,7 @@ def extract_files(fs: FileSystem, chunk_map: Optional[ChunkMap] = None,
                 size=inode_item.size,
                 type=file_type,
                 mode=mode,
-                mode_str=parse_mode(mode),
+                mode_str=mode_str,
                 uid=inode_item.uid,
                 gid=inode_item.gid,
                 nlink=inode_item.nlink,
@@ -782,35 +1463,41 @@ def extract_files(fs: FileSystem, chunk_map: Optional[ChunkMap] = None,
             # Store unique_inode for extraction lookup
             entry.unique_inode = unique_inode
 
-            # Calculate physical offset if we have extents and chunk_map
-            if chunk_map and unique_inode in fs.extents and fs.extents[unique_inode]:
-                first_extent = fs.extents[unique_inode][0]
-                logical_addr = first_extent[1]  # disk_bytenr
-                if logical_addr > 0:  # Skip holes/sparse extents
-                    physical_offset = chunk_map.logical_to_physical(logical_addr)
-                    if physical_offset:
-                        entry.physical_offset = physical_offset
+            # Physical offset of the first extent (translated up front)
+            physical_offset = first_physical.get(unique_inode)
+            if physical_offset:
+                entry.physical_offset = physical_offset
+
+            # Verify data blocks against the checksum tree
+            if csum_data_starts and unique_inode in fs.extents:
+                try:
+                    entry.checksum_errors = verify_file_checksums(
+                        disk_file, fs.extents[unique_inode], chunk_map,
+                        csum_data_starts, fs.csum_data, sectorsize, csum_size,
+                        extent_errors)
+                except Exception:
+                    pass  # Leave unverified
 
             # Calculate MD5/SHA256 hashes for regular files
             if (file_type == 'file' and disk_file and chunk_map and
                 unique_inode in fs.extents and inode_item.size > 0):
-                try:
-                    # Read file data (limit to actual file size)
-                    file_data = read_file_data(disk_file, fs.extents[unique_inode],
-                                              chunk_map, inode_item.size)
-                    # Calculate hashes
-                    md5_hash, sha256_hash = calculate_hashes(file_data)
-                    entry.md5 = md5_hash
-                    entry.sha256 = sha256_hash
-                except Exception:
-                    # Skip files that fail to read
-                    pass
+                # Hashed below (limit to actual file size)
+                hash_jobs.append((entry, fs.extents[unique_inode], inode_item.size))
 
             entries.append(entry)
         except Exception:
             # Skip entries that fail to convert
             continue
 
+    # Files with identical extents (e.g. one file seen in several snapshots)
+    # have identical contents, so each distinct (extents, size) is hashed
+    # once. Files that fail to read keep md5/sha256 of None
+    fingerprints = [(tuple(extents), size) for _, extents, size in hash_jobs]
+    distinct = list(dict.fromkeys(fingerprints))
+    hashes = dict(zip(distinct, _hash_files(disk_file, distinct, chunk_map, image_path)))
+    for (entry, _, _), fingerprint in zip(hash_jobs, fingerprints):
+        entry.md5, entry.sha256 = hashes[fingerprint]
+
     # Sort by path
-    entries.sort(key=lambda e: e.path)
+    entries.sort(key=attrgetter('path'))
     return entries
@@ -2,23 +2,107 @@
 BTRFS Output Formatters - JSON, CSV, and console output.
 """
 import json
-import csv
-from typing import List
+import re
+from dataclasses import fields
+from operator import attrgetter
+from typing import Iterator, List, TextIO
 from io import StringIO
-from dataclasses import asdict
 
 from filesystem import FileEntry
 
+# Optional fast JSON encoder; falls back to the json module
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
 
-def to_json(entries: List[FileEntry], indent: int = 2) -> str:
+
+# Fields only present in the output when checksums were verified (--verify)
+VERIFY_FIELDS = ('checksum_errors',)
+
+# FileEntry is flat: a shallow name -> value dict is all asdict() would give
+_VERIFIED_ENTRY_FIELDS = tuple(f.name for f in fields(FileEntry))
+_ENTRY_FIELDS = tuple(name for name in _VERIFIED_ENTRY_FIELDS if name not in VERIFY_FIELDS)
+_entry_values = attrgetter(*_ENTRY_FIELDS)
+_verified_entry_values = attrgetter(*_VERIFIED_ENTRY_FIELDS)
+
+
+# Characters json.dumps() escapes by default (ensure_ascii) but orjson writes raw
+_NON_ASCII = re.compile('[\x7f-\U0010ffff]')
+
+
+def _escape_char(match) -> str:
+    """Escape one character as json.dumps() does, as a surrogate pair past U+FFFF."""
+    code = ord(match.group())
+    if code > 0xFFFF:
+        code -= 0x10000
+        return '\\u{:04x}\\u{:04x}'.format(0xD800 | (code >> 10), 0xDC00 | (code & 0x3FF))
+    return '\\u{:04x}'.format(code)
+
+
+def ascii_json(text: str) -> str:
+    """
+    Escape the non-ASCII characters of orjson output.
+
+    The result is ASCII-only JSON, like json.dumps() writes, so it is safe
+    to write to any locale's stdout or default-encoded file. Outside
+    strings, JSON text is ASCII already.
+    """
+    return text if text.isascii() and '\x7f' not in text else _NON_ASCII.sub(_escape_char, text)
+
+
+def _dump_entry(entry: FileEntry, indent: int, verified: bool) -> str:
+    """Serialize one entry's fields as indented JSON."""
+    if verified:
+        row = dict(zip(_VERIFIED_ENTRY_FIELDS, _verified_entry_values(entry)))
+    else:
+        row = dict(zip(_ENTRY_FIELDS, _entry_values(entry)))
+    if HAS_ORJSON and indent == 2:
+        try:
+            return ascii_json(orjson.dumps(row, option=orjson.OPT_INDENT_2).decode())
+        except TypeError:
+            pass  # e.g. an int wider than 64 bits
+    return json.dumps(row, indent=indent)
+
+
+def iter_json(entries: List[FileEntry], indent: int = 2,
+              verified: bool = False) -> Iterator[str]:
+    """
+    Yield the JSON array of file entries in chunks, one entry at a time.
+
+    The concatenated chunks equal json.dumps([asdict(e) ...], indent=indent),
+    without building the list of dicts or the whole string up front.
+    Entries are not deep-copied through asdict(). The VERIFY_FIELDS are
+    only included when `verified`. The output is the same, ASCII-only,
+    whether or not orjson is installed (see ascii_json()).
+    """
+    if not entries:
+        yield '[]'
+        return
+
+    pad = ' ' * indent
+    sep = '[\n' + pad
+    for e in entries:
+        # JSON strings never contain raw newlines, so re-indenting is safe
+        yield sep + _dump_entry(e, indent, verified).replace('\n', '\n' + pad)
+        sep = ',\n' + pad
+    yield '\n]'
+
+
+def to_json(entries: List[FileEntry], indent: int = 2, verified: bool = False) -> str:
     """Convert file entries to JSON string."""
-    return json.dumps([asdict(e) for e in entries], indent=indent)
+    return ''.join(iter_json(entries, indent, verified))
 
 
-def to_csv(entries: List[FileEntry]) -> str:
+def to_csv(entries: List[FileEntry], verified: bool = False) -> str:
     """Convert file entries to CSV string."""
     output = StringIO()
-    fieldnames = ['path', 'name', 'type', 'size', 'mode_str',
+    write_csv(entries, output, verified)
+    return output.getvalue()
+
+
+CSV_FIELDNAMES = ['path', 'name', 'type', 'size', 'mode_str',
                   'uid', 'uid_name', 'gid', 'gid_name', 'nlink',
                   'atime', 'mtime', 'ctime', 'otime',
                   'inode', 'subvolume_id',
@@ -27,42 +111,87 @@ def to_csv(entries: List[FileEntry]) -> str:
                   'xattr_count', 'checksum_count',
                   'md5', 'sha256']
 
-    writer = csv.DictWriter(output, fieldnames=fieldnames)
-    writer.writeheader()
+# With --verify, checksum_errors follows checksum_count
+CSV_VERIFIED_FIELDNAMES = (CSV_FIELDNAMES[:CSV_FIELDNAMES.index('checksum_count') + 1] +
+                           list(VERIFY_FIELDS) +
+                           CSV_FIELDNAMES[CSV_FIELDNAMES.index('checksum_count') + 1:])
 
-    for entry in entries:
-        row = {
-            'path': entry.path,
-            'name': entry.name,
-            'type': entry.type,
-            'size': entry.size,
-            'mode_str': entry.mode_str,
-            'uid': entry.uid,
-            'uid_name': entry.uid_name,
-            'gid': entry.gid,
-            'gid_name': entry.gid_name,
-            'nlink': entry.nlink,
-            'atime': entry.atime,
-            'mtime': entry.mtime,
-            'ctime': entry.ctime,
-            'otime': entry.otime,
-            'inode': entry.inode,
-            'subvolume_id': entry.subvolume_id,
-            'generation': entry.generation,
-            'transid': entry.transid,
-            'flags': entry.flags,
-            'flags_str': entry.flags_str,
-            'extent_count': entry.extent_count,
-            'disk_bytes': entry.disk_bytes,
-            'physical_offset': entry.physical_offset,
-            'xattr_count': entry.xattr_count,
-            'checksum_count': entry.checksum_count,
-            'md5': entry.md5,
-            'sha256': entry.sha256,
-        }
-        writer.writerow(row)
+# Rows are joined and written this many at a time
+CSV_ROWS_PER_WRITE = 4096
 
-    return output.getvalue()
+# JSON entries are joined and written this many at a time
+JSON_ENTRIES_PER_WRITE = 1024
+
+# Buffer size for output files opened by write_output_file
+OUTPUT_BUFFER_SIZE = 1 << 20
+
+
+def _csv_field(value) -> str:
+    """Format one value the way csv.writer's QUOTE_MINIMAL dialect would."""
+    if value is None:
+        return ''
+    value = str(value)
+    if ',' in value or '"' in value or '\n' in value or '\r' in value:
+        return '"' + value.replace('"', '""') + '"'
+    return value
+
+
+# Free-text columns, which go through CSV quoting
+_CSV_TEXT_FIELDS = {'path', 'name', 'type', 'mode_str', 'uid_name', 'gid_name', 'flags_str'}
+# Numeric columns that are never None; the rest (optional numbers, ISO
+# times, hex digests) are written as '' when None and never need quoting
+_CSV_INT_FIELDS = {'size', 'uid', 'gid', 'nlink', 'inode', 'extent_count',
+                   'disk_bytes', 'xattr_count', 'checksum_count'}
+
+
+def _build_csv_row_formatter(fieldnames: List[str]):
+    """
+    Generate a function returning one entry's CSV row with the given columns.
+
+    The row is a single f-string with every column inlined, so formatting
+    an entry costs no per-field function calls beyond quoting free text.
+    """
+    columns = []
+    for name in fieldnames:
+        if name in _CSV_TEXT_FIELDS:
+            columns.append(f"{{_q(e.{name})}}")
+        elif name in _CSV_INT_FIELDS:
+            columns.append(f"{{e.{name}}}")
+        else:
+            columns.append(f"{{'' if e.{name} is None else e.{name}}}")
+    source = 'def _format_csv_row(e):\n    return f"' + ','.join(columns) + '"\n'
+    namespace = {'_q': _csv_field}
+    exec(source, namespace)
+    return namespace['_format_csv_row']
+
+
+_format_csv_row = _build_csv_row_formatter(CSV_FIELDNAMES)
+_format_verified_csv_row = _build_csv_row_formatter(CSV_VERIFIED_FIELDNAMES)
+
+
+def write_csv(entries: List[FileEntry], out: TextIO, verified: bool = False) -> None:
+    """
+    Write file entries as CSV rows straight to `out`.
+
+    Output matches csv.DictWriter with the default dialect (CRLF line
+    endings, minimal quoting), but rows are formatted directly rather than
+    through a dict per entry (see _build_csv_row_formatter). The
+    checksum_errors column is only written when `verified`.
+    """
+    if verified:
+        fieldnames, format_row = CSV_VERIFIED_FIELDNAMES, _format_verified_csv_row
+    else:
+        fieldnames, format_row = CSV_FIELDNAMES, _format_csv_row
+    rows = [','.join(fieldnames)]
+    for entry in entries:
+        rows.append(format_row(entry))
+        if len(rows) >= CSV_ROWS_PER_WRITE:
+            rows.append('')
+            out.write('\r\n'.join(rows))
+            rows = []
+    if rows:
+        rows.append('')
+        out.write('\r\n'.join(rows))
 
 
 def to_console(entries: List[FileEntry]) -> str:
@@ -100,16 +229,36 @@ def to_console(entries: List[FileEntry]) -> str:
 
 def to_tree(entries: List[FileEntry]) -> str:
     """Format file entries as a tree structure."""
-    # Build tree structure
+    # Build tree structure: a directory with children is a dict of its
+    # entries, anything else (including an empty directory) its FileEntry.
+    # `stack` holds the dicts along the previous entry's parent path so
+    # siblings and cousins reuse them instead of descending from the root.
     tree = {}
+    stack = [tree]
+    prev_dirs = []
     for entry in entries:
         parts = entry.path.strip('/').split('/')
-        current = tree
-        for part in parts[:-1]:
-            if part not in current:
-                current[part] = {}
-            current = current[part]
-        if parts:
+        if parts == ['']:
+            continue  # the root directory itself
+        dirs = parts[:-1]
+
+        common = 0
+        limit = min(len(dirs), len(prev_dirs))
+        while common < limit and dirs[common] == prev_dirs[common]:
+            common += 1
+        del stack[common + 1:]
+
+        current = stack[-1]
+        for part in dirs[common:]:
+            child = current.get(part)
+            if not isinstance(child, dict):
+                # Replacing a directory's FileEntry keeps its position
+                child = current[part] = {}
+            current = child
+            stack.append(current)
+        prev_dirs = dirs
+
+        if not isinstance(current.get(parts[-1]), dict):
             current[parts[-1]] = entry
 
     lines = []
@@ -134,3 +283,34 @@ def to_tree(entries: List[FileEntry]) -> str:
     lines.append('/')
     print_tree(tree)
     return '\n'.join(lines)
+
+
+def write_output(entries: List[FileEntry], fmt: str, out: TextIO,
+                 verified: bool = False) -> None:
+    """
+    Write entries in the given format ('json', 'csv', 'tree' or 'console') to `out`.
+
+    JSON and CSV are streamed entry by entry rather than built as one string.
+    `verified` adds the checksum verification fields to JSON and CSV.
+    """
+    if fmt == 'json':
+        chunks = []
+        for chunk in iter_json(entries, verified=verified):
+            chunks.append(chunk)
+            if len(chunks) >= JSON_ENTRIES_PER_WRITE:
+                out.write(''.join(chunks))
+                chunks = []
+        out.write(''.join(chunks))
+    elif fmt == 'csv':
+        write_csv(entries, out, verified)
+    elif fmt == 'tree':
+        out.write(to_tree(entries))
+    else:
+        out.write(to_console(entries))
+
+
+def write_output_file(entries: List[FileEntry], fmt: str, path: str,
+                      verified: bool = False) -> None:
+    """Write entries in the given format to the file at `path` through a large buffer."""
+    with open(path, 'w', buffering=OUTPUT_BUFFER_SIZE) as out:
+        write_output(entries, fmt, out, verified)
@@ -3,10 +3,27 @@ BTRFS Partition Detection - Automatically detect BTRFS partitions in disk images
 
 Supports both MBR (Master Boot Record) and GPT (GUID Partition Table) partition schemes.
 """
+import mmap
 import struct
-from typing import List, Tuple, Optional
+from typing import BinaryIO, List, Tuple, Optional
 from dataclasses import dataclass
 from constants import BTRFS_MAGIC, SUPERBLOCK_OFFSET
+from btree import open_image, read_at, advise_sequential
+
+# Superblock field offsets used to validate a magic hit
+_SB_BYTENR = 0x30
+_SB_MAGIC = 0x40
+_SB_TOTAL_BYTES = 0x70
+_SB_LABEL = 0x12B
+
+# MBR partition entry: type byte, LBA start, sector count
+_MBR_ENTRY = struct.Struct('<4xB3xII')
+# GPT header fields at 0x48: entry LBA, entry count, entry size
+_GPT_HEADER_ENTRIES = struct.Struct('<QII')
+# GPT partition entry: type GUID, (unique GUID skipped), start/end LBA,
+# (attributes skipped), UTF-16LE name
+_GPT_ENTRY = struct.Struct('<16s16xQQ8x72s')
+_GPT_EMPTY_GUID = bytes(16)
 
 
 @dataclass
@@ -50,32 +67,30 @@ def read_mbr(image_path: str) -> List[Tuple[int, int, int]]:
     - Offset 0x08: LBA start (4 bytes, little endian)
     - Offset 0x0C: Number of sectors (4 bytes, little endian)
     """
-    partitions = []
+    with open_image(image_path) as image:
+        return _read_mbr(image)
 
-    with open(image_path, 'rb') as f:
-        # Read MBR
-        f.seek(0)
-        mbr = f.read(512)
 
-        # Check MBR signature
-        if len(mbr) < 512 or mbr[0x1FE:0x200] != b'\x55\xAA':
-            return partitions
+def _read_mbr(image: BinaryIO) -> List[Tuple[int, int, int]]:
+    """read_mbr() on an already open image (file or mmap)."""
+    partitions = []
+
+    # Read MBR
+    mbr = read_at(image, 0, 512)
 
-        # Parse 4 partition entries
-        for i in range(4):
-            offset = 0x1BE + (i * 16)
-            entry = mbr[offset:offset + 16]
+    # Check MBR signature
+    if len(mbr) < 512 or mbr[0x1FE:0x200] != b'\x55\xAA':
+        return partitions
 
-            # Extract fields
-            partition_type = entry[0x04]
-            lba_start = struct.unpack('<I', entry[0x08:0x0C])[0]
-            num_sectors = struct.unpack('<I', entry[0x0C:0x10])[0]
+    # Parse 4 partition entries
+    for i in range(4):
+        partition_type, lba_start, num_sectors = _MBR_ENTRY.unpack_from(mbr, 0x1BE + i * 16)
 
-            # Skip empty partitions
-            if partition_type == 0 or num_sectors == 0:
-                continue
+        # Skip empty partitions
+        if partition_type == 0 or num_sectors == 0:
+            continue
 
-            partitions.append((i + 1, lba_start, num_sectors))
+        partitions.append((i + 1, lba_start, num_sectors))
 
     return partitions
 
@@ -112,48 +127,53 @@ def read_gpt(image_path: str) -> List[Tuple[int, int, int, str]]:
     - Offset 0x30: Attributes (8 bytes)
     - Offset 0x38: Partition name (72 bytes, UTF-16LE)
     """
+    with open_image(image_path) as image:
+        return _read_gpt(image)
+
+
+def _read_gpt(image: BinaryIO) -> List[Tuple[int, int, int, str]]:
+    """read_gpt() on an already open image (file or mmap)."""
     partitions = []
 
-    with open(image_path, 'rb') as f:
-        # Read GPT header at LBA 1
-        f.seek(512)
-        header = f.read(512)
+    # Read GPT header at LBA 1
+    header = read_at(image, 512, 512)
 
-        # Check GPT signature
-        if len(header) < 92 or header[0:8] != b'EFI PART':
-            return partitions
+    # Check GPT signature
+    if len(header) < 92 or header[0:8] != b'EFI PART':
+        return partitions
 
-        # Parse GPT header
-        partition_entry_lba = struct.unpack('<Q', header[0x48:0x50])[0]
-        num_entries = struct.unpack('<I', header[0x50:0x54])[0]
-        entry_size = struct.unpack('<I', header[0x54:0x58])[0]
+    # Parse GPT header
+    partition_entry_lba, num_entries, entry_size = _GPT_HEADER_ENTRIES.unpack_from(header, 0x48)
 
-        # Read partition entries
-        f.seek(partition_entry_lba * 512)
-        entries_data = f.read(num_entries * entry_size)
+    # Entries are at least 128 bytes (larger sizes are allowed by the spec)
+    if entry_size < _GPT_ENTRY.size:
+        return partitions
 
-        for i in range(num_entries):
-            offset = i * entry_size
-            entry = entries_data[offset:offset + entry_size]
+    # Read partition entries
+    entries_data = read_at(image, partition_entry_lba * 512, num_entries * entry_size)
 
-            # Check if partition is empty (all zeros in type GUID)
-            type_guid = entry[0:16]
-            if type_guid == b'\x00' * 16:
-                continue
+    # Only whole entries are parsed; the standard 128-byte layout is walked
+    # by iter_unpack in one C loop
+    end = min(num_entries, len(entries_data) // entry_size) * entry_size
+    if entry_size == _GPT_ENTRY.size:
+        entries = _GPT_ENTRY.iter_unpack(memoryview(entries_data)[:end])
+    else:
+        entries = (_GPT_ENTRY.unpack_from(entries_data, offset)
+                   for offset in range(0, end, entry_size))
 
-            # Parse partition entry
-            start_lba = struct.unpack('<Q', entry[0x20:0x28])[0]
-            end_lba = struct.unpack('<Q', entry[0x28:0x30])[0]
+    for i, (type_guid, start_lba, end_lba, name_bytes) in enumerate(entries):
+        # Check if partition is empty (all zeros in type GUID)
+        if type_guid == _GPT_EMPTY_GUID:
+            continue
 
-            # Parse partition name (UTF-16LE, null-terminated)
-            name_bytes = entry[0x38:0x38 + 72]
-            try:
-                name = name_bytes.decode('utf-16-le').rstrip('\x00')
-            except:
-                name = ''
+        # Parse partition name (UTF-16LE, null-terminated)
+        try:
+            name = name_bytes.decode('utf-16-le').rstrip('\x00')
+        except:
+            name = ''
 
-            size_lba = end_lba - start_lba + 1
-            partitions.append((i + 1, start_lba, size_lba, name))
+        size_lba = end_lba - start_lba + 1
+        partitions.append((i + 1, start_lba, size_lba, name))
 
     return partitions
 
@@ -166,50 +186,106 @@ def check_btrfs_signature(image_path: str, partition_offset: int) -> Tuple[bool,
         (is_btrfs, label) - tuple of boolean and optional label string
     """
     try:
-        with open(image_path, 'rb') as f:
-            # Seek to superblock location within partition
-            f.seek(partition_offset + SUPERBLOCK_OFFSET)
+        with open_image(image_path) as image:
+            return _check_btrfs_signature(image, partition_offset)
+    except Exception:
+        return False, None
+
+
+def _check_btrfs_signature(image: BinaryIO, partition_offset: int) -> Tuple[bool, Optional[str]]:
+    """check_btrfs_signature() on an already open image (file or mmap)."""
+    try:
+        superblock = partition_offset + SUPERBLOCK_OFFSET
 
-            # Read magic number location (offset 0x40 within superblock)
-            f.seek(partition_offset + SUPERBLOCK_OFFSET + 0x40)
-            magic = f.read(8)
+        # One read covers the magic (offset 0x40) through the end of the
+        # label (offset 0x12B, 256 bytes)
+        fields = read_at(image, superblock + _SB_MAGIC, _SB_LABEL + 256 - _SB_MAGIC)
 
-            if magic != BTRFS_MAGIC:
-                return False, None
+        if fields[:8] != BTRFS_MAGIC:
+            return False, None
 
-            # Read label (offset 0x12B within superblock, 256 bytes)
-            f.seek(partition_offset + SUPERBLOCK_OFFSET + 0x12B)
-            label_bytes = f.read(256)
+        label_bytes = fields[_SB_LABEL - _SB_MAGIC:]
 
-            # Parse label (null-terminated string)
-            label = label_bytes.split(b'\x00', 1)[0].decode('utf-8', errors='ignore')
+        # Parse label (null-terminated string)
+        label = label_bytes.split(b'\x00', 1)[0].decode('utf-8', errors='ignore')
 
-            return True, label if label else None
+        return True, label if label else None
 
     except Exception:
         return False, None
 
 
+def scan_btrfs_superblocks(image: mmap.mmap) -> List[Partition]:
+    """
+    Find BTRFS filesystems in a mapped image that has no usable partition table.
+
+    mmap.find() locates each magic in C; a hit counts only if it sits at a
+    sector-aligned primary superblock whose bytenr field points at itself
+    (which rules out the backup superblock copies). The scan resumes after
+    the end of each filesystem found.
+    """
+    found = []
+    advise_sequential(image)
+    pos = SUPERBLOCK_OFFSET + _SB_MAGIC
+    while True:
+        hit = image.find(BTRFS_MAGIC, pos)
+        if hit < 0:
+            break
+        pos = hit + len(BTRFS_MAGIC)
+
+        offset = hit - _SB_MAGIC - SUPERBLOCK_OFFSET
+        if offset % 512:
+            continue
+        superblock = offset + SUPERBLOCK_OFFSET
+        fields = image[superblock + _SB_BYTENR:superblock + _SB_TOTAL_BYTES + 8]
+        if len(fields) < 0x48 or struct.unpack_from('<Q', fields, 0)[0] != SUPERBLOCK_OFFSET:
+            continue
+
+        is_btrfs, label = _check_btrfs_signature(image, offset)
+        if not is_btrfs:
+            continue
+        total_bytes = struct.unpack_from('<Q', fields, _SB_TOTAL_BYTES - _SB_BYTENR)[0]
+        size = min(total_bytes, len(image) - offset) if total_bytes else len(image) - offset
+        found.append(Partition(
+            index=len(found) + 1,
+            offset=offset,
+            size=size,
+            type_name='Unpartitioned',
+            label=label
+        ))
+        pos = max(pos, offset + size)
+
+    return found
+
+
 def detect_btrfs_partitions(image_path: str) -> List[Partition]:
     """
     Detect all BTRFS partitions in a disk image.
 
-    Supports both MBR and GPT partition schemes.
+    Supports both MBR and GPT partition schemes. Only images without a
+    usable partition table are scanned for BTRFS superblocks instead; a
+    table listing no BTRFS partition gives an empty result.
 
     Returns:
         List of Partition objects with BTRFS filesystems
     """
+    with open_image(image_path) as image:
+        return _detect_btrfs_partitions(image)
+
+
+def _detect_btrfs_partitions(image: BinaryIO) -> List[Partition]:
+    """detect_btrfs_partitions() on an already open image (file or mmap)."""
     btrfs_partitions = []
 
     # Try MBR first
-    mbr_partitions = read_mbr(image_path)
+    mbr_partitions = _read_mbr(image)
 
     if mbr_partitions:
         for index, start_sector, num_sectors in mbr_partitions:
             offset = start_sector * 512
             size = num_sectors * 512
 
-            is_btrfs, label = check_btrfs_signature(image_path, offset)
+            is_btrfs, label = _check_btrfs_signature(image, offset)
 
             if is_btrfs:
                 partition = Partition(
@@ -225,14 +301,14 @@ def detect_btrfs_partitions(image_path: str) -> List[Partition]:
             return btrfs_partitions
 
     # Try GPT
-    gpt_partitions = read_gpt(image_path)
+    gpt_partitions = _read_gpt(image)
 
     if gpt_partitions:
         for index, start_lba, size_lba, name in gpt_partitions:
             offset = start_lba * 512
             size = size_lba * 512
 
-            is_btrfs, label = check_btrfs_signature(image_path, offset)
+            is_btrfs, label = _check_btrfs_signature(image, offset)
 
             if is_btrfs:
                 partition = Partition(
@@ -244,6 +320,14 @@ def detect_btrfs_partitions(image_path: str) -> List[Partition]:
                 )
                 btrfs_partitions.append(partition)
 
+        if btrfs_partitions:
+            return btrfs_partitions
+
+    # Only an image with no usable partition table is scanned for bare
+    # filesystems; when a table exists its boundaries are authoritative
+    if not mbr_partitions and not gpt_partitions and isinstance(image, mmap.mmap):
+        btrfs_partitions = scan_btrfs_superblocks(image)
+
     return btrfs_partitions
 
 
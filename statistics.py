@@ -2,11 +2,22 @@
 BTRFS Statistics Module - Calculate and export file statistics.
 """
 from collections import defaultdict
+from functools import lru_cache
 from typing import List, Dict, Any
 import json
-import os
 import sys
 from filesystem import FileEntry
+from output import ascii_json
+
+# Optional fast JSON encoder; falls back to the json module
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+# Distinct extensions seen in a filesystem are few; reuse their lowercased form
+_lower_extension = lru_cache(maxsize=1024)(str.lower)
 
 
 def get_file_extension(entry: FileEntry) -> str:
@@ -26,13 +37,14 @@ def get_file_extension(entry: FileEntry) -> str:
     if not entry.name:
         return '(no extension)'
 
-    # Use os.path.splitext for reliable extension extraction
-    _, ext = os.path.splitext(entry.name)
-
-    if ext:
-        return ext.lower()
-    else:
+    # Same rule as os.path.splitext: the extension starts at the last dot,
+    # which must follow something other than leading dots
+    name = entry.name
+    dot = name.rfind('.')
+    start = name.rfind('/') + 1
+    if dot <= start or not name[start:dot].lstrip('.'):
         return '(no extension)'
+    return _lower_extension(name[dot:])
 
 
 def calculate_statistics(entries: List[FileEntry]) -> Dict[str, Any]:
@@ -59,71 +71,98 @@ def calculate_statistics(entries: List[FileEntry]) -> Dict[str, Any]:
         "by_gid": defaultdict(lambda: {"gid": None, "gid_name": None, "count": 0, "total_size_bytes": 0})
     })
 
-    # Single pass aggregation - O(n) complexity
+    # Single pass aggregation - O(n) complexity. Each entry costs one dict
+    # operation on its (extension, type, uid, gid) combination; the few
+    # distinct combinations are then folded into the tables below
+    groups = {}
     for entry in entries:
-        ext = get_file_extension(entry)
-        size = entry.size
-
+        key = (get_file_extension(entry), entry.type, entry.uid, entry.gid)
+        group = groups.get(key)
+        if group is None:
+            groups[key] = [1, entry.size, entry.uid_name, entry.gid_name]
+        else:
+            group[0] += 1
+            group[1] += entry.size
+
+    for (ext, file_type, uid, gid), (count, size, uid_name, gid_name) in groups.items():
         # By extension
-        by_extension[ext]["count"] += 1
+        by_extension[ext]["count"] += count
         by_extension[ext]["total_size_bytes"] += size
 
         # By type
-        by_type[entry.type]["count"] += 1
-        by_type[entry.type]["total_size_bytes"] += size
-
-        # By ownership (uid -> gid hierarchy)
-        uid_key = f"uid_{entry.uid}"
-        by_uid[uid_key]["uid"] = entry.uid
-        by_uid[uid_key]["uid_name"] = entry.uid_name
-        by_uid[uid_key]["count"] += 1
-        by_uid[uid_key]["total_size_bytes"] += size
-
-        gid_key = f"gid_{entry.gid}"
-        by_uid[uid_key]["by_gid"][gid_key]["gid"] = entry.gid
-        by_uid[uid_key]["by_gid"][gid_key]["gid_name"] = entry.gid_name
-        by_uid[uid_key]["by_gid"][gid_key]["count"] += 1
-        by_uid[uid_key]["by_gid"][gid_key]["total_size_bytes"] += size
-
-    # Calculate summary metrics
+        by_type[file_type]["count"] += count
+        by_type[file_type]["total_size_bytes"] += size
+
+        # By ownership (uid -> gid hierarchy), keyed by the ids themselves
+        owner = by_uid[uid]
+        owner["uid"] = uid
+        owner["uid_name"] = uid_name
+        owner["count"] += count
+        owner["total_size_bytes"] += size
+
+        group_stats = owner["by_gid"][gid]
+        group_stats["gid"] = gid
+        group_stats["gid_name"] = gid_name
+        group_stats["count"] += count
+        group_stats["total_size_bytes"] += size
+
+    # Calculate summary metrics from the per-type totals rather than
+    # further passes over the entries
+    directories = by_type["directory"]["count"] if "directory" in by_type else 0
     summary = {
-        "total_files": sum(1 for e in entries if e.type != 'directory'),
-        "total_size_bytes": sum(e.size for e in entries),
-        "total_directories": sum(1 for e in entries if e.type == 'directory'),
-        "total_symlinks": sum(1 for e in entries if e.type == 'symlink'),
+        "total_files": len(entries) - directories,
+        "total_size_bytes": sum(t["total_size_bytes"] for t in by_type.values()),
+        "total_directories": directories,
+        "total_symlinks": by_type["symlink"]["count"] if "symlink" in by_type else 0,
         "unique_extensions": len(by_extension),
         "unique_owners": len(by_uid)
     }
 
-    # Convert defaultdicts to regular dicts for JSON serialization
+    # Convert defaultdicts to regular dicts for JSON serialization, naming
+    # the owner keys "uid_<n>" / "gid_<n>" only now
     return {
         "summary": summary,
         "by_extension": dict(by_extension),
         "by_type": dict(by_type),
         "by_ownership": {
-            k: {
+            f"uid_{uid}": {
                 **v,
-                "by_gid": dict(v["by_gid"])
+                "by_gid": {f"gid_{gid}": g for gid, g in v["by_gid"].items()}
             }
-            for k, v in by_uid.items()
+            for uid, v in by_uid.items()
         }
     }
 
 
-def write_statistics_json(stats: dict, output_path: str) -> None:
+def write_statistics_json(stats: dict, output_path: str) -> bool:
     """Write statistics to JSON file with error handling.
 
     Args:
         stats: Dictionary containing calculated statistics
         output_path: Path where JSON file should be written
 
+    Returns:
+        True if the file was written, False if an I/O error was reported
+
     Note:
-        Errors are non-fatal - prints warning and continues
+        I/O errors are non-fatal - prints warning and continues
     """
+    data = None
+    if HAS_ORJSON:
+        try:
+            # Same indent-2, ASCII-only text as json.dump, encoded in C
+            data = ascii_json(orjson.dumps(stats, option=orjson.OPT_INDENT_2).decode())
+        except TypeError:
+            pass  # e.g. a size total wider than 64 bits
     try:
         with open(output_path, 'w') as f:
-            json.dump(stats, f, indent=2)
+            if data is None:
+                json.dump(stats, f, indent=2)
+            else:
+                f.write(data)
     except IOError as e:
         # Non-fatal error - print warning but continue
         print(f"Warning: Could not write statistics to {output_path}: {e}",
               file=sys.stderr)
+        return False
+    return True
@@ -2,8 +2,10 @@
 BTRFS Data Structures - Dataclass definitions for parsing binary data.
 """
 import struct
+import sys
 from dataclasses import dataclass
 from datetime import datetime
+from functools import lru_cache
 from typing import List
 
 # Structure size constants
@@ -17,8 +19,39 @@ BTRFS_CHUNK_ITEM_FIXED_SIZE = 48
 BTRFS_STRIPE_SIZE = 32        # devid(8) + offset(8) + dev_uuid(16)
 BTRFS_DEV_ITEM_SIZE = 98
 
-
-@dataclass
+# Precompiled layouts, shared by every parser module. Struct.unpack_from
+# skips the format-string lookup that struct.unpack_from(fmt, ...) does.
+# The unpack() classmethods below bind these as default arguments (never
+# passed by callers), so a call does no global or attribute lookups.
+U16 = struct.Struct('<H')
+U32 = struct.Struct('<I')
+U64 = struct.Struct('<Q')
+KEY_STRUCT = struct.Struct('<QBQ')                  # objectid, type, offset
+ITEM_STRUCT = struct.Struct('<QBQII')               # key + offset(4) + size(4)
+KEY_PTR_STRUCT = struct.Struct('<QBQQQ')            # key + blockptr(8) + generation(8)
+TIMESPEC_STRUCT = struct.Struct('<QI')
+HEADER_STRUCT = struct.Struct('<32s16sQQ16sQQIB')
+# Just nritems(4) + level(1), at NODE_INFO_OFFSET of the header. Much cheaper
+# than building a full BtrfsHeader when only those two fields are needed.
+NODE_INFO_STRUCT = struct.Struct('<IB')
+NODE_INFO_OFFSET = 96
+INODE_ITEM_STRUCT = struct.Struct('<5Q4I3Q32xQIQIQIQI')
+FILE_EXTENT_STRUCT = struct.Struct('<QQBBHB')       # fields common to all extent types
+FILE_EXTENT_DISK_STRUCT = struct.Struct('<4Q')      # regular/prealloc extents only
+DIR_ITEM_STRUCT = struct.Struct('<QBQQHHB')         # location key + transid, data_len, name_len, type
+CHUNK_STRUCT = struct.Struct('<4Q3I2H')
+STRIPE_STRUCT = struct.Struct('<QQ16s')             # devid, offset, dev_uuid
+# Superblock fields 0x30-0xC8: bytenr through log_root_level, skipping
+# log_root_transid, leafsize and the three feature-flag words
+SUPERBLOCK_FIELDS_STRUCT = struct.Struct('<2Q8s4Q8x4Q2I4x2IQ24xH3B')
+SUPERBLOCK_FIELDS_OFFSET = 0x30
+
+# Types created per key, item or inode: drop the per-instance __dict__ where
+# dataclasses support it (Python 3.10+)
+DATACLASS_SLOTS = {'slots': True} if sys.version_info >= (3, 10) else {}
+
+
+@dataclass(**DATACLASS_SLOTS)
 class BtrfsKey:
     """17 bytes: objectid(8) + type(1) + offset(8)"""
     objectid: int
@@ -26,36 +59,48 @@ class BtrfsKey:
     offset: int
 
     @classmethod
-    def unpack(cls, data: bytes, pos: int = 0) -> 'BtrfsKey':
-        objectid = struct.unpack_from('<Q', data, pos)[0]
-        type_ = struct.unpack_from('<B', data, pos + 8)[0]
-        offset = struct.unpack_from('<Q', data, pos + 9)[0]
-        return cls(objectid, type_, offset)
+    def unpack(cls, data: bytes, pos: int = 0,
+               _unpack_from=KEY_STRUCT.unpack_from) -> 'BtrfsKey':
+        return cls(*_unpack_from(data, pos))
 
     def __repr__(self):
         return f"Key({self.objectid}, {self.type}, {self.offset})"
 
 
-@dataclass
+@dataclass(**DATACLASS_SLOTS)
 class BtrfsTimespec:
     """12 bytes: sec(8) + nsec(4)"""
     sec: int
     nsec: int
 
     @classmethod
-    def unpack(cls, data: bytes, pos: int = 0) -> 'BtrfsTimespec':
-        sec = struct.unpack_from('<Q', data, pos)[0]
-        nsec = struct.unpack_from('<I', data, pos + 8)[0]
-        return cls(sec, nsec)
+    def unpack(cls, data: bytes, pos: int = 0,
+               _unpack_from=TIMESPEC_STRUCT.unpack_from) -> 'BtrfsTimespec':
+        return cls(*_unpack_from(data, pos))
 
     def to_datetime(self) -> datetime:
-        try:
-            return datetime.fromtimestamp(self.sec + self.nsec / 1e9)
-        except (OSError, OverflowError, ValueError):
-            return datetime(1970, 1, 1)
+        return _timespec_datetime(self.sec, self.nsec)
 
     def to_iso(self) -> str:
-        return self.to_datetime().isoformat()
+        return _timespec_iso(self.sec, self.nsec)
+
+
+# Timestamps repeat heavily across inodes (files copied or extracted
+# together); datetime is immutable, so converted values can be shared
+TIMESPEC_CACHE_SIZE = 4096
+
+
+@lru_cache(maxsize=TIMESPEC_CACHE_SIZE)
+def _timespec_datetime(sec: int, nsec: int) -> datetime:
+    try:
+        return datetime.fromtimestamp(sec + nsec / 1e9)
+    except (OSError, OverflowError, ValueError):
+        return datetime(1970, 1, 1)
+
+
+@lru_cache(maxsize=TIMESPEC_CACHE_SIZE)
+def _timespec_iso(sec: int, nsec: int) -> str:
+    return _timespec_datetime(sec, nsec).isoformat()
 
 
 @dataclass
@@ -72,21 +117,12 @@ class BtrfsHeader:
     level: int            # 1 byte (0=leaf)
 
     @classmethod
-    def unpack(cls, data: bytes, pos: int = 0) -> 'BtrfsHeader':
-        return cls(
-            csum=data[pos:pos+32],
-            fsid=data[pos+32:pos+48],
-            bytenr=struct.unpack_from('<Q', data, pos+48)[0],
-            flags=struct.unpack_from('<Q', data, pos+56)[0],
-            chunk_tree_uuid=data[pos+64:pos+80],
-            generation=struct.unpack_from('<Q', data, pos+80)[0],
-            owner=struct.unpack_from('<Q', data, pos+88)[0],
-            nritems=struct.unpack_from('<I', data, pos+96)[0],
-            level=struct.unpack_from('<B', data, pos+100)[0],
-        )
+    def unpack(cls, data: bytes, pos: int = 0,
+               _unpack_from=HEADER_STRUCT.unpack_from) -> 'BtrfsHeader':
+        return cls(*_unpack_from(data, pos))
 
 
-@dataclass
+@dataclass(**DATACLASS_SLOTS)
 class BtrfsItem:
     """25 bytes - item descriptor in leaf node."""
     key: BtrfsKey         # 17 bytes
@@ -94,15 +130,13 @@ class BtrfsItem:
     size: int             # 4 bytes - size of data
 
     @classmethod
-    def unpack(cls, data: bytes, pos: int = 0) -> 'BtrfsItem':
-        return cls(
-            key=BtrfsKey.unpack(data, pos),
-            offset=struct.unpack_from('<I', data, pos+17)[0],
-            size=struct.unpack_from('<I', data, pos+21)[0],
-        )
+    def unpack(cls, data: bytes, pos: int = 0,
+               _unpack_from=ITEM_STRUCT.unpack_from, _key=BtrfsKey) -> 'BtrfsItem':
+        objectid, type_, key_offset, offset, size = _unpack_from(data, pos)
+        return cls(_key(objectid, type_, key_offset), offset, size)
 
 
-@dataclass
+@dataclass(**DATACLASS_SLOTS)
 class BtrfsKeyPtr:
     """33 bytes - key pointer in internal node."""
     key: BtrfsKey         # 17 bytes
@@ -110,15 +144,13 @@ class BtrfsKeyPtr:
     generation: int       # 8 bytes
 
     @classmethod
-    def unpack(cls, data: bytes, pos: int = 0) -> 'BtrfsKeyPtr':
-        return cls(
-            key=BtrfsKey.unpack(data, pos),
-            blockptr=struct.unpack_from('<Q', data, pos+17)[0],
-            generation=struct.unpack_from('<Q', data, pos+25)[0],
-        )
+    def unpack(cls, data: bytes, pos: int = 0,
+               _unpack_from=KEY_PTR_STRUCT.unpack_from, _key=BtrfsKey) -> 'BtrfsKeyPtr':
+        objectid, type_, offset, blockptr, generation = _unpack_from(data, pos)
+        return cls(_key(objectid, type_, offset), blockptr, generation)
 
 
-@dataclass
+@dataclass(**DATACLASS_SLOTS)
 class BtrfsInodeItem:
     """160 bytes - file/directory metadata."""
     generation: int       # 8
@@ -140,26 +172,16 @@ class BtrfsInodeItem:
     otime: BtrfsTimespec  # 12 - creation time
 
     @classmethod
-    def unpack(cls, data: bytes, pos: int = 0) -> 'BtrfsInodeItem':
-        return cls(
-            generation=struct.unpack_from('<Q', data, pos)[0],
-            transid=struct.unpack_from('<Q', data, pos+8)[0],
-            size=struct.unpack_from('<Q', data, pos+16)[0],
-            nbytes=struct.unpack_from('<Q', data, pos+24)[0],
-            block_group=struct.unpack_from('<Q', data, pos+32)[0],
-            nlink=struct.unpack_from('<I', data, pos+40)[0],
-            uid=struct.unpack_from('<I', data, pos+44)[0],
-            gid=struct.unpack_from('<I', data, pos+48)[0],
-            mode=struct.unpack_from('<I', data, pos+52)[0],
-            rdev=struct.unpack_from('<Q', data, pos+56)[0],
-            flags=struct.unpack_from('<Q', data, pos+64)[0],
-            sequence=struct.unpack_from('<Q', data, pos+72)[0],
-            # skip reserved[4] at pos+80 (32 bytes)
-            atime=BtrfsTimespec.unpack(data, pos+112),
-            ctime=BtrfsTimespec.unpack(data, pos+124),
-            mtime=BtrfsTimespec.unpack(data, pos+136),
-            otime=BtrfsTimespec.unpack(data, pos+148),
-        )
+    def unpack(cls, data: bytes, pos: int = 0,
+               _unpack_from=INODE_ITEM_STRUCT.unpack_from, _ts=BtrfsTimespec) -> 'BtrfsInodeItem':
+        # reserved[4] (32 bytes at pos+80) is skipped by the layout
+        (generation, transid, size, nbytes, block_group, nlink, uid, gid, mode,
+         rdev, flags, sequence, a_sec, a_nsec, c_sec, c_nsec, m_sec, m_nsec,
+         o_sec, o_nsec) = _unpack_from(data, pos)
+        return cls(generation, transid, size, nbytes, block_group, nlink, uid,
+                   gid, mode, rdev, flags, sequence,
+                   _ts(a_sec, a_nsec), _ts(c_sec, c_nsec),
+                   _ts(m_sec, m_nsec), _ts(o_sec, o_nsec))
 
 
 @dataclass
@@ -178,24 +200,20 @@ class BtrfsFileExtentItem:
     num_bytes: int       # 8 bytes - number of bytes in this extent
 
     @classmethod
-    def unpack(cls, data: bytes, pos: int = 0) -> 'BtrfsFileExtentItem':
+    def unpack(cls, data: bytes, pos: int = 0,
+               _unpack_from=FILE_EXTENT_STRUCT.unpack_from,
+               _unpack_disk_from=FILE_EXTENT_DISK_STRUCT.unpack_from) -> 'BtrfsFileExtentItem':
         if len(data) < pos + 21:
             raise ValueError("Data too short for BtrfsFileExtentItem")
 
-        generation = struct.unpack_from('<Q', data, pos)[0]
-        ram_bytes = struct.unpack_from('<Q', data, pos+8)[0]
-        compression = struct.unpack_from('<B', data, pos+16)[0]
-        encryption = struct.unpack_from('<B', data, pos+17)[0]
-        other = struct.unpack_from('<H', data, pos+18)[0]
-        type_ = struct.unpack_from('<B', data, pos+20)[0]
+        generation, ram_bytes, compression, encryption, other, type_ = \
+            _unpack_from(data, pos)
 
         # For inline extents (type=0), data is embedded and there's no disk_bytenr
         # For regular/prealloc extents (type=1,2), parse disk location
         if type_ in (1, 2) and len(data) >= pos + 53:
-            disk_bytenr = struct.unpack_from('<Q', data, pos+21)[0]
-            disk_num_bytes = struct.unpack_from('<Q', data, pos+29)[0]
-            offset = struct.unpack_from('<Q', data, pos+37)[0]
-            num_bytes = struct.unpack_from('<Q', data, pos+45)[0]
+            disk_bytenr, disk_num_bytes, offset, num_bytes = \
+                _unpack_disk_from(data, pos+21)
         else:
             # Inline extent or insufficient data
             disk_bytenr = 0
@@ -215,17 +233,21 @@ class BtrfsDirItem:
     data_len: int         # 2 bytes - xattr data length
     name_len: int         # 2 bytes
     type: int             # 1 byte - file type (BTRFS_FT_*)
-    name: str             # variable
+    name_raw: bytes       # variable, decoded on access through `name`
 
     @classmethod
-    def unpack(cls, data: bytes, pos: int = 0) -> 'BtrfsDirItem':
-        location = BtrfsKey.unpack(data, pos)
-        transid = struct.unpack_from('<Q', data, pos+17)[0]
-        data_len = struct.unpack_from('<H', data, pos+25)[0]
-        name_len = struct.unpack_from('<H', data, pos+27)[0]
-        type_ = struct.unpack_from('<B', data, pos+29)[0]
-        name = data[pos+30:pos+30+name_len].decode('utf-8', errors='replace')
-        return cls(location, transid, data_len, name_len, type_, name)
+    def unpack(cls, data: bytes, pos: int = 0,
+               _unpack_from=DIR_ITEM_STRUCT.unpack_from, _key=BtrfsKey) -> 'BtrfsDirItem':
+        objectid, key_type, offset, transid, data_len, name_len, type_ = \
+            _unpack_from(data, pos)
+        location = _key(objectid, key_type, offset)
+        # Copied rather than viewed, so a stored item does not pin its leaf
+        name_raw = bytes(data[pos+30:pos+30+name_len])
+        return cls(location, transid, data_len, name_len, type_, name_raw)
+
+    @property
+    def name(self) -> str:
+        return str(self.name_raw, 'utf-8', 'replace')
 
     @property
     def total_size(self) -> int:
@@ -248,24 +270,19 @@ class BtrfsChunk:
 
     @classmethod
     def unpack(cls, data: bytes, pos: int = 0) -> 'BtrfsChunk':
-        length = struct.unpack_from('<Q', data, pos)[0]
-        owner = struct.unpack_from('<Q', data, pos+8)[0]
-        stripe_len = struct.unpack_from('<Q', data, pos+16)[0]
-        type_ = struct.unpack_from('<Q', data, pos+24)[0]
-        io_align = struct.unpack_from('<I', data, pos+32)[0]
-        io_width = struct.unpack_from('<I', data, pos+36)[0]
-        sector_size = struct.unpack_from('<I', data, pos+40)[0]
-        num_stripes = struct.unpack_from('<H', data, pos+44)[0]
-        sub_stripes = struct.unpack_from('<H', data, pos+46)[0]
-
-        stripes = []
-        stripe_pos = pos + 48
-        for _ in range(num_stripes):
-            devid = struct.unpack_from('<Q', data, stripe_pos)[0]
-            offset = struct.unpack_from('<Q', data, stripe_pos+8)[0]
-            dev_uuid = data[stripe_pos+16:stripe_pos+32]
-            stripes.append((devid, offset, dev_uuid))
-            stripe_pos += 32
+        (length, owner, stripe_len, type_, io_align, io_width, sector_size,
+         num_stripes, sub_stripes) = CHUNK_STRUCT.unpack_from(data, pos)
+
+        # (devid, offset, dev_uuid) per stripe, unpacked in one C-level pass
+        # over the stripe array
+        stripe_array = memoryview(data)[pos + 48:pos + 48 + 32 * num_stripes]
+        try:
+            if len(stripe_array) != 32 * num_stripes:
+                # iter_unpack would quietly return fewer stripes
+                raise struct.error(f"chunk item truncated: {num_stripes} stripes expected")
+            stripes = list(STRIPE_STRUCT.iter_unpack(stripe_array))
+        finally:
+            stripe_array.release()
 
         return cls(length, owner, stripe_len, type_, io_align,
                    io_width, sector_size, num_stripes, sub_stripes, stripes)
@@ -275,6 +292,11 @@ class BtrfsChunk:
         return 48 + (32 * self.num_stripes)
 
 
+# Bytes per data checksum, by superblock csum_type
+# (0 = CRC32C, 1 = xxHash64, 2 = SHA-256, 3 = BLAKE2b-256)
+CSUM_TYPE_SIZES = {0: 4, 1: 8, 2: 32, 3: 32}
+
+
 @dataclass
 class BtrfsSuperblock:
     """4096 bytes - filesystem superblock."""
@@ -300,40 +322,53 @@ class BtrfsSuperblock:
     root_level: int
     chunk_root_level: int
     log_root_level: int
-    label: str
+    label_raw: bytes      # up to the first NUL, decoded on access through `label`
     sys_chunk_array: bytes
 
     @classmethod
     def unpack(cls, data: bytes) -> 'BtrfsSuperblock':
-        label_raw = data[0x12B:0x12B+256]
-        label = label_raw.split(b'\x00')[0].decode('utf-8', errors='replace')
+        label_raw = data[0x12B:0x12B+256].split(b'\x00')[0]
+
+        (bytenr, flags, magic, generation, root, chunk_root, log_root,
+         total_bytes, bytes_used, root_dir_objectid, num_devices,
+         sectorsize, nodesize, stripesize, sys_chunk_array_size,
+         chunk_root_generation, csum_type, root_level, chunk_root_level,
+         log_root_level) = SUPERBLOCK_FIELDS_STRUCT.unpack_from(data, SUPERBLOCK_FIELDS_OFFSET)
 
         return cls(
             csum=data[0x00:0x20],
             fsid=data[0x20:0x30],
-            bytenr=struct.unpack_from('<Q', data, 0x30)[0],
-            flags=struct.unpack_from('<Q', data, 0x38)[0],
-            magic=data[0x40:0x48],
-            generation=struct.unpack_from('<Q', data, 0x48)[0],
-            root=struct.unpack_from('<Q', data, 0x50)[0],
-            chunk_root=struct.unpack_from('<Q', data, 0x58)[0],
-            log_root=struct.unpack_from('<Q', data, 0x60)[0],
-            total_bytes=struct.unpack_from('<Q', data, 0x70)[0],
-            bytes_used=struct.unpack_from('<Q', data, 0x78)[0],
-            root_dir_objectid=struct.unpack_from('<Q', data, 0x80)[0],
-            num_devices=struct.unpack_from('<Q', data, 0x88)[0],
-            sectorsize=struct.unpack_from('<I', data, 0x90)[0],
-            nodesize=struct.unpack_from('<I', data, 0x94)[0],
-            stripesize=struct.unpack_from('<I', data, 0x9C)[0],
-            sys_chunk_array_size=struct.unpack_from('<I', data, 0xA0)[0],
-            chunk_root_generation=struct.unpack_from('<Q', data, 0xA4)[0],
-            csum_type=struct.unpack_from('<H', data, 0xC4)[0],
-            root_level=struct.unpack_from('<B', data, 0xC6)[0],
-            chunk_root_level=struct.unpack_from('<B', data, 0xC7)[0],
-            log_root_level=struct.unpack_from('<B', data, 0xC8)[0],
-            label=label,
+            bytenr=bytenr,
+            flags=flags,
+            magic=magic,
+            generation=generation,
+            root=root,
+            chunk_root=chunk_root,
+            log_root=log_root,
+            total_bytes=total_bytes,
+            bytes_used=bytes_used,
+            root_dir_objectid=root_dir_objectid,
+            num_devices=num_devices,
+            sectorsize=sectorsize,
+            nodesize=nodesize,
+            stripesize=stripesize,
+            sys_chunk_array_size=sys_chunk_array_size,
+            chunk_root_generation=chunk_root_generation,
+            csum_type=csum_type,
+            root_level=root_level,
+            chunk_root_level=chunk_root_level,
+            log_root_level=log_root_level,
+            label_raw=label_raw,
             sys_chunk_array=data[0x32B:0x32B+2048],
         )
 
+    @property
+    def label(self) -> str:
+        return self.label_raw.decode('utf-8', errors='replace')
+
+    @property
+    def csum_size(self) -> int:
+        return CSUM_TYPE_SIZES.get(self.csum_type, 32)
+
     def validate(self) -> bool:
         return self.magic == b'_BHRfS_M'
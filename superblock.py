@@ -1,8 +1,12 @@
 """
 BTRFS Superblock Parser - Read and validate superblock from image file.
 """
+from typing import BinaryIO
+from uuid import UUID
+
 from constants import SUPERBLOCK_OFFSET, SUPERBLOCK_SIZE, BTRFS_MAGIC
 from structures import BtrfsSuperblock
+from btree import read_at
 
 
 def read_superblock(image_path: str, partition_offset: int = 0) -> BtrfsSuperblock:
@@ -13,21 +17,24 @@ def read_superblock(image_path: str, partition_offset: int = 0) -> BtrfsSuperblo
         image_path: Path to image file
         partition_offset: Byte offset where the BTRFS partition starts (default: 0)
     """
-    absolute_offset = partition_offset + SUPERBLOCK_OFFSET
+    # Unbuffered: the one positioned read needs no BufferedReader over it
+    with open(image_path, 'rb', buffering=0) as f:
+        return read_superblock_from(f, partition_offset)
+
 
-    with open(image_path, 'rb') as f:
-        f.seek(absolute_offset)
-        data = f.read(SUPERBLOCK_SIZE)
+def read_superblock_from(image: BinaryIO, partition_offset: int = 0) -> BtrfsSuperblock:
+    """read_superblock() on an already open image (file or mmap)."""
+    data = read_at(image, partition_offset + SUPERBLOCK_OFFSET, SUPERBLOCK_SIZE)
 
     if len(data) != SUPERBLOCK_SIZE:
         raise ValueError(f"Failed to read superblock: got {len(data)} bytes, expected {SUPERBLOCK_SIZE}")
 
-    sb = BtrfsSuperblock.unpack(data)
-
-    if not sb.validate():
-        raise ValueError(f"Invalid BTRFS magic: {sb.magic!r}, expected {BTRFS_MAGIC!r}")
+    # Reject on the magic before building the full BtrfsSuperblock
+    magic = data[0x40:0x48]
+    if magic != BTRFS_MAGIC:
+        raise ValueError(f"Invalid BTRFS magic: {magic!r}, expected {BTRFS_MAGIC!r}")
 
-    return sb
+    return BtrfsSuperblock.unpack(data)
 
 
 def print_superblock_info(sb: BtrfsSuperblock):
@@ -48,5 +55,8 @@ def print_superblock_info(sb: BtrfsSuperblock):
 
 def format_uuid(uuid_bytes: bytes) -> str:
     """Format UUID bytes as standard UUID string."""
-    hex_str = uuid_bytes.hex()
+    if len(uuid_bytes) == 16:
+        # uuid.UUID formats the 8-4-4-4-12 groups in one call
+        return str(UUID(bytes=bytes(uuid_bytes)))
+    hex_str = bytes(uuid_bytes).hex()
     return f"{hex_str[0:8]}-{hex_str[8:12]}-{hex_str[12:16]}-{hex_str[16:20]}-{hex_str[20:32]}"